@@ -0,0 +1,49 @@
+# Standard
+from decimal import Decimal
+import timeit
+# External
+from boto3.dynamodb.types import Binary
+# Internal
+from ..ddb import _serialize, _unmarshal, _unmarshal_many, des, ser
+
+def sample_item(width: int = 50):
+    item = {
+        'id': 'a1b2c3d4',
+        'created': 1700000000,
+        'updated': 1700000500,
+        'active': True,
+        'deleted': None,
+        'score': Decimal('12.375'),
+        'tags': { 'alpha', 'beta', 'gamma' },
+        'blob': Binary(b'\x00' * 64),
+        'history': [ { 'ts': 1700000000 + i, 'value': Decimal(i) / 8, 'note': f'event {i}' } for i in range(20) ],
+    }
+    for i in range(width):
+        item[f'attr_{i}'] = f'value {i}' if i % 2 else i * 1000
+    return item
+
+def bench(label: str, fn, number: int):
+    seconds = min(timeit.repeat(fn, number = number, repeat = 5))
+    print(f'{label:<32}{number / seconds:>14,.0f} ops/s')
+    return seconds
+
+def main(number: int = 2000, page: int = 100):
+    item = sample_item()
+    wire = _serialize(item)['M']
+    items = [ wire ] * page
+    assert _serialize(item) == ser.serialize(item)
+    assert _unmarshal(wire) == { k: des.deserialize(v) for k, v in wire.items() }
+    base = bench('TypeSerializer.serialize', lambda: ser.serialize(item), number)
+    fast = bench('_serialize', lambda: _serialize(item), number)
+    print(f'{"":<32}{base / fast:>13.2f}x')
+    base = bench('TypeDeserializer.deserialize', lambda: { k: des.deserialize(v) for k, v in wire.items() }, number)
+    fast = bench('_unmarshal', lambda: _unmarshal(wire), number)
+    print(f'{"":<32}{base / fast:>13.2f}x')
+    fast = bench('_unmarshal(float_numbers)', lambda: _unmarshal(wire, float_numbers = True), number)
+    print(f'{"":<32}{base / fast:>13.2f}x')
+    base = bench(f'deserialize page of {page}', lambda: [ { k: des.deserialize(v) for k, v in w.items() } for w in items ], number // page)
+    fast = bench(f'_unmarshal_many page of {page}', lambda: _unmarshal_many(items), number // page)
+    print(f'{"":<32}{base / fast:>13.2f}x')
+
+if __name__ == '__main__':
+    main()
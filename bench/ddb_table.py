@@ -0,0 +1,95 @@
+# Standard
+from datetime import timedelta
+from threading import local
+import time
+from typing import Callable, Dict
+# Internal
+from .. import ddb
+from ..ddb import ItemCache, TableWithUniques, UpdateAdd
+from ..ddb_mock import MockDynamoDB
+
+CODEC_FUNCTIONS = [ '_serialize', '_unmarshal', '_unmarshal_many' ]
+
+class CodecTimer:
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.state = local()
+        self.originals: Dict[str, Callable] = {}
+
+    def __enter__(self):
+        for name in CODEC_FUNCTIONS:
+            original = getattr(ddb, name)
+            self.originals[name] = original
+            setattr(ddb, name, self._wrap(original))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for name, original in self.originals.items():
+            setattr(ddb, name, original)
+
+    def _wrap(self, fn: Callable):
+        def timed(*args, **kwargs):
+            if getattr(self.state, 'active', False):
+                return fn(*args, **kwargs)
+            self.state.active = True
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self.state.active = False
+        return timed
+
+def attrs(i: int, width: int = 20):
+    return {
+        'user': f'u{i}',
+        'email': f'u{i}@example.com',
+        'score': i,
+        'tags': { 'alpha', 'beta' },
+        'profile': { f'field_{j}': f'value {j}' for j in range(width) },
+    }
+
+def bench(label: str, n: int, fn: Callable[[int], None]):
+    with CodecTimer() as codec:
+        start = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        seconds = time.perf_counter() - start
+    print(f'{label:<28}{n / seconds:>12,.0f} ops/s{codec.seconds / seconds:>10.0%} codec')
+
+def main(n: int = 2000, batch: int = 100):
+    client = MockDynamoDB(seed = 0)
+    table = TableWithUniques('bench', 'user', uq_keys = [ 'email' ], client = client)
+    cached = TableWithUniques('bench', 'user', uq_keys = [ 'email' ], client = client,
+        cache = ItemCache(max_items = n, ttl = timedelta(minutes = 5)))
+    ids = [ f'u{i}' for i in range(n) ]
+    emails = [ f'u{i}@example.com' for i in range(n) ]
+    bench('put', n, lambda i: table.put(attrs(i)))
+    bench('get', n, lambda i: table.get(ids[i]))
+    bench('get (cached)', n, lambda i: cached.get(ids[i % batch], consistent = False))
+    bench('get_uq', n, lambda i: table.get_uq('email', emails[i]))
+    bench('update', n, lambda i: table.update(ids[i], { 'score': i + 1, 'tags': UpdateAdd({ 'gamma' }) }))
+    bench('put_sk', n, lambda i: table.put_sk(ids[i % batch], f'ORDER#{i:06d}', { 'total': i }))
+    bench('get_sk', n, lambda i: table.get_sk(ids[i % batch], f'ORDER#{i:06d}'))
+    rounds = max(1, n // batch)
+    bench(f'list_sk ({n // batch} rows)', rounds, lambda i: table.list_sk(ids[i % batch], 'ORDER#'))
+    bench(f'list_sk_many ({batch} ids)', rounds, lambda i: table.list_sk_many(ids[:batch], 'ORDER#'))
+    bench(f'get_many ({batch})', rounds, lambda i: table.get_many(ids[i * batch:(i + 1) * batch], thread_count = 4))
+    bench(f'get_many lazy ({batch})', rounds, lambda i: [ item['score'] for item in table.get_many(
+        ids[i * batch:(i + 1) * batch], thread_count = 4, lazy = True) ])
+    bench(f'get_many_uq ({batch})', rounds, lambda i: table.get_many_uq('email', emails[i * batch:(i + 1) * batch]))
+    bench(f'update_many ({batch})', rounds, lambda i: table.update_many(
+        [ (id_val, { 'score': 0 }) for id_val in ids[i * batch:(i + 1) * batch] ]))
+    bench(f'put_many ({batch})', rounds, lambda i: table.put_many(
+        [ attrs(n + i * batch + j) for j in range(batch) ]))
+    def write_batch(i: int):
+        with table.batch_writer() as writer:
+            for j in range(batch):
+                writer.put_sk(ids[j], f'EVENT#{i:04d}#{j:04d}', { 'seq': j })
+    bench(f'batch_writer ({batch})', rounds, write_batch)
+    bench('scan (all entities)', 1, lambda i: sum(1 for _ in table.scan(total_segments = 4)))
+    bench('delete', n, lambda i: table.delete(attrs(i)))
+
+if __name__ == '__main__':
+    main()
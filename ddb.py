@@ -1,13 +1,30 @@
 # Standard
 from abc import ABC, abstractmethod
+from base64 import b64decode
+from collections import OrderedDict, deque
+from collections.abc import Iterator, Mapping, Set
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from enum import Enum
 from itertools import islice
 import json
-from typing import Any, Callable, Dict, Iterable, List, NotRequired, TypedDict
+import logging
+import os
+from queue import Empty as QEmpty, Full as QFull, Queue
+import random
+from threading import Event, Lock, Thread
+import time
+from typing import Any, Callable, Dict, Iterable, List, NotRequired, Tuple, TypedDict
+import zlib
 # External
 import boto3
-from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from botocore.exceptions import ClientError
+from boto3.dynamodb.types import Binary, DYNAMODB_CONTEXT, TypeSerializer, TypeDeserializer
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 CLIENT_NAME = 'dynamodb'
 
@@ -25,14 +42,164 @@ class DDB():
 ser = TypeSerializer()
 des = TypeDeserializer()
 
+UPDATE_TEMPLATES_MAX = 1024
+
+BATCH_GET_SIZE = 100
+MAX_TRANSACT_ITEMS = 100
+BATCH_WRITE_SIZE = 25
+COUNTER = 'COUNTER'
+COUNTER_SHARDS = 10
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 5.0
+MAX_INT_N = 10 ** 38
+
+def _backoff(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP):
+    time.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
+
+def _json_default(v):
+    if isinstance(v, Decimal):
+        return int(v) if v == v.to_integral_value() else float(v)
+    if isinstance(v, (set, frozenset)):
+        return sorted(v)
+    if isinstance(v, Binary):
+        v = v.value
+    if isinstance(v, (bytes, bytearray)):
+        return v.decode(errors = 'replace')
+    return str(v)
+
 def _now():
     return round(datetime.now(timezone.utc).timestamp())
 
+def _is_number(v):
+    if isinstance(v, (int, Decimal)):
+        return True
+    if isinstance(v, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    return False
+
+def _encode_n(v):
+    if type(v) is int and -MAX_INT_N < v < MAX_INT_N:
+        return str(v)
+    number = str(DYNAMODB_CONTEXT.create_decimal(v))
+    if number in [ 'Infinity', 'NaN' ]:
+        raise TypeError('Infinity and NaN not supported')
+    return number
+
+def _encode_b(v):
+    return v.value if isinstance(v, Binary) else v
+
+def _encode_set(v):
+    if all(map(_is_number, v)):
+        return { 'NS': [ _encode_n(n) for n in v ] }
+    if all(isinstance(x, str) for x in v):
+        return { 'SS': list(v) }
+    if all(isinstance(x, (Binary, bytearray, bytes)) for x in v):
+        return { 'BS': [ _encode_b(b) for b in v ] }
+    raise TypeError(f'Unsupported type "{type(v)}" for value "{v}"')
+
+def _encode_slow(v):
+    if v is None:
+        return { 'NULL': True }
+    if isinstance(v, bool):
+        return { 'BOOL': v }
+    if _is_number(v):
+        return { 'N': _encode_n(v) }
+    if isinstance(v, str):
+        return { 'S': v }
+    if isinstance(v, (Binary, bytearray, bytes)):
+        return { 'B': _encode_b(v) }
+    if isinstance(v, Set):
+        return _encode_set(v)
+    if isinstance(v, Mapping):
+        return { 'M': { k: _serialize(x) for k, x in v.items() } }
+    if isinstance(v, (list, tuple)):
+        return { 'L': [ _serialize(x) for x in v ] }
+    raise TypeError(f'Unsupported type "{type(v)}" for value "{v}"')
+
+ENCODE_BY_TYPE: Dict[type, Callable[[Any], dict]] = {
+    str: lambda v: { 'S': v },
+    int: lambda v: { 'N': _encode_n(v) },
+    bool: lambda v: { 'BOOL': v },
+    type(None): lambda v: { 'NULL': True },
+    Decimal: lambda v: { 'N': _encode_n(v) },
+    dict: lambda v: { 'M': { k: _serialize(x) for k, x in v.items() } },
+    list: lambda v: { 'L': [ _serialize(x) for x in v ] },
+    tuple: lambda v: { 'L': [ _serialize(x) for x in v ] },
+    set: _encode_set,
+    frozenset: _encode_set,
+    bytes: lambda v: { 'B': v },
+    bytearray: lambda v: { 'B': v },
+    Binary: lambda v: { 'B': v.value },
+}
+
 def _serialize(v):
-    return ser.serialize(v)
+    encode = ENCODE_BY_TYPE.get(type(v))
+    if encode is None:
+        return _encode_slow(v)
+    return encode(v)
+
+def _decode_n_float(v: str):
+    if '.' in v or 'e' in v or 'E' in v:
+        return float(v)
+    return int(v)
+
+def _b64_bytes(v: str | bytes):
+    return b64decode(v) if isinstance(v, str) else v
+
+def _decoder(decode_n: Callable[[str], Any], raw_b: Callable[[Any], bytes] = None, decompress: bool = False):
+    def decode_b(x):
+        if raw_b is not None:
+            x = raw_b(x)
+        # only binary values can hold compressed attributes, so other types skip the marker check
+        if decompress and isinstance(x, (bytes, bytearray)) and x.startswith(COMPRESSED_MARKER):
+            try:
+                return decode(_decompress_value({ 'B': x }))
+            except ImportError:
+                raise
+            except Exception:
+                # a user binary that merely starts with the marker is returned as is
+                return Binary(x)
+        return Binary(x)
+    def decode_bs(x):
+        return set(Binary(raw_b(y)) for y in x) if raw_b is not None else set(map(Binary, x))
+    def decode(v: dict):
+        for t, x in v.items():
+            if t == 'S':
+                return x
+            try:
+                return table[t](x)
+            except KeyError:
+                raise TypeError(f'Dynamodb type {t} is not supported')
+        raise TypeError('Value must be a nonempty dictionary whose key is a valid dynamodb type.')
+    table: Dict[str, Callable[[Any], Any]] = {
+        'N': decode_n,
+        'BOOL': lambda x: x,
+        'NULL': lambda x: None,
+        'M': lambda x: { k: decode(y) for k, y in x.items() },
+        'L': lambda x: [ decode(y) for y in x ],
+        'SS': set,
+        'NS': lambda x: set(map(decode_n, x)),
+        'B': decode_b,
+        'BS': decode_bs,
+    }
+    return decode
+
+# keyed by (float_numbers, stream, decompress)
+_DECODERS: Dict[Tuple[bool, bool, bool], Callable[[dict], Any]] = {
+    (f, s, z): _decoder(_decode_n_float if f else DYNAMODB_CONTEXT.create_decimal, _b64_bytes if s else None, z)
+    for f in (False, True) for s in (False, True) for z in (False, True)
+}
+_decode = _DECODERS[False, False, False]
+
+def _unmarshal(item, float_numbers: bool = False, decompress: bool = False):
+    if not item:
+        return None
+    decode = _DECODERS[float_numbers, False, decompress]
+    return { k: decode(v) for k, v in item.items() }
 
-def _unmarshal(item):
-    return { k: des.deserialize(v) for k, v in item.items() } if item else None
+def _unmarshal_many(items: Iterable[dict], float_numbers: bool = False, decompress: bool = False):
+    decode = _DECODERS[float_numbers, False, decompress]
+    return [ { k: decode(v) for k, v in item.items() } for item in items ]
 
 class Encoding(Enum):
     NONE = 0
@@ -61,6 +228,9 @@ class UpdateAction(ABC):
     @abstractmethod
     def value(self):
         pass
+    @property
+    def shape(self):
+        return type(self)
 
 class UpdateAdd(UpdateAction):
     def __init__(self, items: set):
@@ -87,9 +257,27 @@ class UpdateListAppend(UpdateAction):
             a.reverse()
         return f'#_{key} = list_append({", ".join(a)})'
     @property
+    def shape(self):
+        return (type(self), self.beginning)
+    @property
     def value(self):
         return self.items
 
+def _update_template(attrs: Dict[str, Any]):
+    acts: Dict[str, List[str]] = {}
+    names: Dict[str, str] = {}
+    for key, val in attrs.items():
+        names[f'#_{key}'] = key
+        if isinstance(val, UpdateAction):
+            act = val.clause.value
+            exp = val.expression(key)
+        else:
+            act = UpdateActionType.SET.value
+            exp = f'#_{key} = :_{key}'
+        acts.setdefault(act, []).append(exp)
+    exps = [ f'{k} ' + ', '.join(v) for k, v in acts.items() ]
+    return '\n'.join(exps), names
+
 class RecordTimestamps(TypedDict):
     created: int
     updated: int
@@ -107,15 +295,515 @@ SK = 'SK'
 
 type Item = Dict[str, Any]
 
+class ItemCache:
+
+    def __init__(self, max_items: int = 1024, ttl: timedelta = timedelta(minutes = 1)):
+        self.max_items = max_items
+        self.ttl = ttl.total_seconds()
+        self.items: OrderedDict[tuple, tuple[float, Item]] = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def get(self, key: tuple):
+        with self.lock:
+            entry = self.items.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.items[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def invalidate(self, *keys: tuple):
+        with self.lock:
+            for key in keys:
+                self.items.pop(key, None)
+
+    def put(self, key: tuple, item: Item):
+        with self.lock:
+            self.items[key] = (time.monotonic() + self.ttl, item)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last = False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.items),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+def _cache_key(item: Item):
+    return (item[PK]['S'], item[SK]['S'])
+
+READ_OPERATIONS = { 'batch_get_item', 'get_item', 'query', 'scan', 'transact_get_items' }
+
+def _capacity_units(operation: str, consumed: dict | List[dict] | None):
+    if consumed is None:
+        return 0.0, 0.0
+    if isinstance(consumed, dict):
+        consumed = [ consumed ]
+    rcu = 0.0
+    wcu = 0.0
+    for c in consumed:
+        if 'ReadCapacityUnits' in c or 'WriteCapacityUnits' in c:
+            rcu += c.get('ReadCapacityUnits', 0.0)
+            wcu += c.get('WriteCapacityUnits', 0.0)
+        elif operation in READ_OPERATIONS:
+            rcu += c.get('CapacityUnits', 0.0)
+        else:
+            wcu += c.get('CapacityUnits', 0.0)
+    return rcu, wcu
+
+class Metrics(ABC):
+    @abstractmethod
+    def record(self, operation: str, latency: float, rcu: float, wcu: float,
+            retries: int = 0,
+            error: bool = False):
+        pass
+
+class NoMetrics(Metrics):
+    def record(self, operation: str, latency: float, rcu: float, wcu: float,
+            retries: int = 0,
+            error: bool = False):
+        pass
+
+class PrintMetrics(Metrics):
+    def record(self, operation: str, latency: float, rcu: float, wcu: float,
+            retries: int = 0,
+            error: bool = False):
+        print('DDB', operation, f'{latency * 1000:.1f}ms', f'rcu={rcu}', f'wcu={wcu}', f'retries={retries}', 'error' if error else 'ok')
+
+class MemoryMetrics(Metrics):
+
+    def __init__(self, samples: int = 1024):
+        self.samples = samples
+        self.lock = Lock()
+        self.stats: Dict[str, dict] = {}
+
+    def record(self, operation: str, latency: float, rcu: float, wcu: float,
+            retries: int = 0,
+            error: bool = False):
+        with self.lock:
+            stats = self.stats.get(operation)
+            if stats is None:
+                stats = self.stats[operation] = {
+                    'calls': 0,
+                    'errors': 0,
+                    'retries': 0,
+                    'rcu': 0.0,
+                    'wcu': 0.0,
+                    'latency': 0.0,
+                    'latencies': deque(maxlen = self.samples),
+                }
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['retries'] += retries
+            stats['rcu'] += rcu
+            stats['wcu'] += wcu
+            stats['latency'] += latency
+            stats['latencies'].append(latency)
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+
+    def snapshot(self, percentiles: Iterable[int] = (50, 90, 99)):
+        result: Dict[str, dict] = {}
+        with self.lock:
+            for operation, stats in self.stats.items():
+                latencies = sorted(stats['latencies'])
+                summary = { k: v for k, v in stats.items() if k != 'latencies' }
+                for p in percentiles:
+                    i = min(len(latencies) - 1, max(0, round(p / 100 * len(latencies)) - 1))
+                    summary[f'p{p}'] = latencies[i]
+                result[operation] = summary
+        return result
+
+THROTTLE_CODES = { 'ProvisionedThroughputExceededException', 'RequestLimitExceeded', 'ThrottlingException' }
+
+def _is_throttle(e: Exception):
+    response = getattr(e, 'response', None) or {}
+    return response.get('Error', {}).get('Code') in THROTTLE_CODES
+
+class TokenBucket:
+
+    def __init__(self, rate: float,
+            burst: float = 1.0,
+            min_rate: float = None,
+        ):
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.rate = rate
+        self.burst = burst
+        self.tokens = rate * burst
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate * self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens > 0:
+                    return
+                delay = -self.tokens / self.rate
+            time.sleep(max(delay, 0.001))
+
+    def consume(self, units: float):
+        with self.lock:
+            self._refill()
+            self.tokens -= units
+
+    def decrease(self, factor: float = 0.5):
+        with self.lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * factor)
+
+    def increase(self, step: float = 0.05):
+        with self.lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate * step)
+
+class CapacityLimiter:
+
+    def __init__(self,
+            rcu: float = None,
+            wcu: float = None,
+            burst: float = 1.0,
+            adaptive: bool = True,
+        ):
+        self.read = TokenBucket(rcu, burst = burst) if rcu is not None else None
+        self.write = TokenBucket(wcu, burst = burst) if wcu is not None else None
+        self.adaptive = adaptive
+        self.throttles = 0
+        self.lock = Lock()
+
+    def _bucket(self, operation: str):
+        return self.read if operation in READ_OPERATIONS else self.write
+
+    def acquire(self, operation: str):
+        bucket = self._bucket(operation)
+        if bucket is not None:
+            bucket.acquire()
+
+    def consume(self, operation: str, rcu: float, wcu: float):
+        if self.read is not None and rcu > 0:
+            self.read.consume(rcu)
+        if self.write is not None and wcu > 0:
+            self.write.consume(wcu)
+
+    def succeeded(self, operation: str):
+        bucket = self._bucket(operation)
+        if self.adaptive and bucket is not None:
+            bucket.increase()
+
+    def throttled(self, operation: str):
+        with self.lock:
+            self.throttles += 1
+        bucket = self._bucket(operation)
+        if self.adaptive and bucket is not None:
+            bucket.decrease()
+
+    def rates(self):
+        return {
+            'rcu': self.read.rate if self.read is not None else None,
+            'wcu': self.write.rate if self.write is not None else None,
+            'throttles': self.throttles,
+        }
+
+COMPRESSED_MARKER = b'\x00DDBZ'
+
+class Compression(Enum):
+    ZLIB = b'z'
+    ZSTD = b's'
+
+class AttributeCompressor:
+
+    def __init__(self,
+            attributes: Iterable[str] = None,
+            threshold: int = None,
+            algorithm: Compression = None,
+            level: int = None,
+        ):
+        if algorithm is None:
+            algorithm = Compression.ZSTD if zstandard is not None else Compression.ZLIB
+        if algorithm == Compression.ZSTD and zstandard is None:
+            raise ImportError('zstandard is required for Compression.ZSTD')
+        self.attributes = set(attributes or [])
+        self.threshold = threshold
+        self.algorithm = algorithm
+        self.level = level
+        self.lock = Lock()
+        self.compressed = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def _compress(self, data: bytes):
+        if self.algorithm == Compression.ZSTD:
+            return zstandard.ZstdCompressor(level = self.level or 3).compress(data)
+        return zlib.compress(data, self.level if self.level is not None else 6)
+
+    def compress(self, key: str, value: dict):
+        if key not in self.attributes and self.threshold is None:
+            return value
+        try:
+            data = json.dumps(value, separators = (',', ':')).encode()
+        except TypeError:
+            return value
+        if key not in self.attributes and len(data) < self.threshold:
+            return value
+        stored = COMPRESSED_MARKER + self.algorithm.value + self._compress(data)
+        if len(stored) >= len(data):
+            return value
+        with self.lock:
+            self.compressed += 1
+            self.raw_bytes += len(data)
+            self.stored_bytes += len(stored)
+        return { 'B': stored }
+
+    def compress_item(self, item: Item, exclude: Iterable[str] = ()):
+        return { k: v if k in exclude else self.compress(k, v) for k, v in item.items() }
+
+    def stats(self):
+        with self.lock:
+            return {
+                'compressed': self.compressed,
+                'raw_bytes': self.raw_bytes,
+                'stored_bytes': self.stored_bytes,
+                'saved_bytes': self.raw_bytes - self.stored_bytes,
+                'ratio': self.stored_bytes / self.raw_bytes if self.raw_bytes > 0 else None,
+            }
+
+def _decompress_value(value: dict):
+    data: bytes = value['B']
+    algorithm = Compression(data[len(COMPRESSED_MARKER):len(COMPRESSED_MARKER) + 1])
+    data = data[len(COMPRESSED_MARKER) + 1:]
+    if algorithm == Compression.ZSTD:
+        if zstandard is None:
+            raise ImportError('zstandard is required to read zstd compressed attributes')
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = zlib.decompress(data)
+    return json.loads(data)
+
+class LazyItem(Mapping):
+    __slots__ = ('_raw', '_decode', '_decoded')
+
+    def __init__(self, raw: Item, decode: Callable[[dict], Any] = _decode):
+        self._raw = raw
+        self._decode = decode
+        self._decoded: Dict[str, Any] = None
+
+    def __getitem__(self, key: str):
+        decoded = self._decoded
+        if decoded is None:
+            decoded = self._decoded = {}
+        elif key in decoded:
+            return decoded[key]
+        decoded[key] = result = self._decode(self._raw[key])
+        return result
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def __repr__(self):
+        return f'LazyItem({list(self._raw)})'
+
+    def to_dict(self):
+        return { k: self[k] for k in self._raw }
+
+class StreamRecord:
+    __slots__ = ('event', 'entity', 'id', 'sk', 'kind', 'keys', 'new', 'old', 'record')
+
+    def __init__(self, record: dict, float_numbers: bool = False, decompress: bool = False):
+        decode = _DECODERS[float_numbers, True, decompress]
+        data: dict = record['dynamodb']
+        self.record = record
+        self.event: str = record.get('eventName')
+        self.keys: Item = data.get('Keys', {})
+        pk: str = self.keys.get(PK, {}).get('S', '')
+        self.sk: str = self.keys.get(SK, {}).get('S')
+        self.entity, _, self.id = pk.partition('#')
+        if self.sk == SK:
+            self.kind = 'unique'
+        elif self.sk == self.entity:
+            self.kind = 'item'
+        else:
+            self.kind = 'child'
+        new = data.get('NewImage')
+        old = data.get('OldImage')
+        self.new = LazyItem(new, decode) if new is not None else None
+        self.old = LazyItem(old, decode) if old is not None else None
+
+    def __repr__(self):
+        return f'StreamRecord({self.event} {self.entity}#{self.id} {self.sk})'
+
+    def changed(self):
+        new = self.new._raw if self.new is not None else {}
+        old = self.old._raw if self.old is not None else {}
+        return { k for k in new.keys() | old.keys() if new.get(k) != old.get(k) }
+
+def decode_stream(event: dict, float_numbers: bool = False, decompress: bool = False):
+    return [ StreamRecord(record, float_numbers = float_numbers, decompress = decompress) for record in event.get('Records', []) ]
+
+def group_stream(records: Iterable[StreamRecord], key: Callable[[StreamRecord], Any] = None):
+    groups: Dict[Any, List[StreamRecord]] = {}
+    for record in records:
+        group = key(record) if key is not None else record.entity
+        groups.setdefault(group, []).append(record)
+    return groups
+
 class TableWithUniques:
 
     def __init__(self, name: str, id_key: str,
             uq_keys: Iterable[str] = None,
+            cache: ItemCache = None,
+            metrics: Metrics = None,
+            limiter: CapacityLimiter = None,
+            client = None,
+            compressor: AttributeCompressor = None,
         ):
-        self.ddb = boto3.client(CLIENT_NAME)
+        self.ddb = client if client is not None else boto3.client(CLIENT_NAME)
         self.name = name
         self.id_key = id_key
         self.uq_keys = uq_keys or []
+        self.cache = cache
+        self.metrics = metrics or NoMetrics()
+        self.limiter = limiter
+        self.update_templates: Dict[tuple, tuple[str, Dict[str, str]]] = {}
+        self.compressor = compressor
+
+    def _batch_get(self, keys: List[Item], consistent = True):
+        result: List[Item] = []
+        attempt = 0
+        while len(keys) > 0:
+            r: dict = self._call('batch_get_item',
+                retries = 1 if attempt > 0 else 0,
+                RequestItems = {
+                    self.name: {
+                        'Keys': keys,
+                        'ConsistentRead': consistent,
+                    }
+                },
+                ReturnConsumedCapacity = 'TOTAL',
+            )
+            all_responses: dict = r.get('Responses', {})
+            responses: List[dict] = all_responses.get(self.name, [])
+            result.extend(responses)
+            all_unprocessed: dict = r.get('UnprocessedKeys', {})
+            unprocessed: dict = all_unprocessed.get(self.name, {})
+            keys = unprocessed.get('Keys', [])
+            if len(keys) > 0:
+                if self.limiter is not None:
+                    self.limiter.throttled('batch_get_item')
+                attempt += 1
+                _backoff(attempt)
+        return result
+
+    def _batch_write(self, requests: List[Item]):
+        attempt = 0
+        while len(requests) > 0:
+            r: dict = self._call('batch_write_item',
+                retries = 1 if attempt > 0 else 0,
+                RequestItems = {
+                    self.name: requests,
+                },
+                ReturnConsumedCapacity = 'TOTAL',
+            )
+            all_unprocessed: dict = r.get('UnprocessedItems', {})
+            requests = all_unprocessed.get(self.name, [])
+            if len(requests) > 0:
+                if self.limiter is not None:
+                    self.limiter.throttled('batch_write_item')
+                attempt += 1
+                _backoff(attempt)
+
+    def _cache_get(self, key: Item, consistent: bool):
+        if self.cache is None or consistent:
+            return None
+        return self.cache.get(_cache_key(key))
+
+    def _cache_invalidate(self, *keys: Item):
+        if self.cache is not None:
+            self.cache.invalidate(*[ _cache_key(key) for key in keys ])
+
+    def _cache_put(self, *items: Item):
+        if self.cache is not None:
+            for item in items:
+                self.cache.put(_cache_key(item), item)
+
+    def _call(self, operation: str, retries: int = 0, **kwargs):
+        if self.limiter is not None:
+            self.limiter.acquire(operation)
+        start = time.perf_counter()
+        try:
+            res: dict = getattr(self.ddb, operation)(**kwargs)
+        except Exception as e:
+            latency = time.perf_counter() - start
+            response = getattr(e, 'response', None) or {}
+            rcu, wcu = _capacity_units(operation, response.get('ConsumedCapacity'))
+            if self.limiter is not None:
+                self.limiter.consume(operation, rcu, wcu)
+                if _is_throttle(e):
+                    self.limiter.throttled(operation)
+            self.metrics.record(operation, latency, rcu, wcu, retries = retries, error = True)
+            raise
+        latency = time.perf_counter() - start
+        rcu, wcu = _capacity_units(operation, res.get('ConsumedCapacity'))
+        if self.limiter is not None:
+            self.limiter.consume(operation, rcu, wcu)
+            self.limiter.succeeded(operation)
+        self.metrics.record(operation, latency, rcu, wcu, retries = retries)
+        return res
+
+    def _counter_sk(self, name: str, shard: int = None):
+        prefix = f'{COUNTER}#{name}#'
+        return prefix if shard is None else f'{prefix}{shard:03d}'
+
+    def _compress(self, item: Item):
+        if self.compressor is None:
+            return item
+        return self.compressor.compress_item(item, exclude = { PK, SK, self.id_key, *self.uq_keys })
+
+    def _compress_value(self, key: str, val: Any):
+        if self.compressor is None or key in self.uq_keys:
+            return _serialize(val)
+        return self.compressor.compress(key, _serialize(val))
+
+    def _decoder(self):
+        return _DECODERS[False, False, self.compressor is not None]
+
+    def _id_attrs(self, item: Item, lazy = False):
+        if lazy:
+            raw = { k: v for k, v in item.items() if k not in (PK, SK) }
+            raw[self.id_key] = { 'S': item[PK]['S'].split('#')[-1] }
+            return LazyItem(raw, self._decoder())
+        attrs = _unmarshal(item, decompress = self.compressor is not None)
+        attrs.pop(SK, None)
+        pk: str = attrs.pop(PK)
+        attrs[self.id_key] = pk.split('#')[-1]
+        return attrs
 
     def _id_key(self, id_val: str,
             encoding: Encoding = Encoding.DEFAULT,
@@ -134,7 +822,121 @@ class TableWithUniques:
         body = self._id_key(id_val, encoding = Encoding.NONE) \
                 | { k: v for k, v in attrs.items() if k != self.id_key } \
                 | new_record()
-        return _serialize(body)['M']
+        return self._compress(_serialize(body)['M'])
+
+    def _iterate_keys(self, keys: Iterable[Item], consistent = True, thread_count: int = 4):
+        assert thread_count >= 1, 'Thread count must be greater than or equal to 1'
+        keys_iter = iter(keys)
+        def next_keys():
+            return list(islice(keys_iter, BATCH_GET_SIZE))
+        with ThreadPoolExecutor(max_workers = thread_count) as pool:
+            pending: set[Future] = set()
+            while True:
+                while len(pending) < thread_count:
+                    keys = next_keys()
+                    if len(keys) == 0:
+                        break
+                    pending.add(pool.submit(self._batch_get, keys, consistent))
+                if len(pending) == 0:
+                    break
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+
+    def _put_actions(self, items: List[Item]):
+        put_args = {
+            'TableName': self.name,
+            'ConditionExpression': f'attribute_not_exists({PK})'
+        }
+        return [ { 'Put': put_args | { 'Item': item } } for item in items ]
+
+    def _put_errors(self, attrs: Item, reasons: List[dict]):
+        id_val = attrs[self.id_key]
+        err = {}
+        for i, reason in enumerate(reasons):
+            if reason['Code'] != 'ConditionalCheckFailed':
+                continue
+            if i == 0:
+                err[self.id_key] = f'Item with {self.id_key}={id_val} already exists'
+            else:
+                uq_key = self.uq_keys[i - 1]
+                uq_val = attrs[uq_key]
+                err[uq_key] = f'Item with {uq_key}={uq_val} already exists'
+        return err
+
+    def _put_group(self, group: List[tuple[int, Item, List[Item]]]):
+        results: Dict[int, dict] = {}
+        while len(group) > 0:
+            try:
+                self._call('transact_write_items',
+                    TransactItems = [ action for _, _, items in group for action in self._put_actions(items) ],
+                    ReturnConsumedCapacity = 'TOTAL',
+                )
+            except self.ddb.exceptions.TransactionCanceledException as e:
+                reasons = e.response['CancellationReasons']
+                retry = []
+                split = False
+                offset = 0
+                for entry in group:
+                    i, attrs, items = entry
+                    entity_reasons = reasons[offset:offset + len(items)]
+                    offset += len(items)
+                    codes = { reason['Code'] for reason in entity_reasons } - { 'None' }
+                    if len(codes) == 0:
+                        retry.append(entry)
+                    elif codes == { 'ConditionalCheckFailed' }:
+                        results[i] = { 'error': self._put_errors(attrs, entity_reasons) }
+                    else:
+                        split = True
+                        retry.append(entry)
+                if split:
+                    if len(retry) == 1:
+                        raise
+                    return results | self._put_split(retry)
+                group = retry
+                continue
+            except ClientError as e:
+                # e.g. two entities in one transaction claiming the same unique value
+                if e.response['Error']['Code'] != 'ValidationException' or len(group) == 1:
+                    raise
+                return results | self._put_split(group)
+            for i, _, items in group:
+                self._cache_put(*items)
+                results[i] = { 'items': [ _unmarshal(item, decompress = self.compressor is not None) for item in items ] }
+            break
+        return results
+
+    def _put_items(self, attrs: Item):
+        id_val = attrs[self.id_key]
+        return [
+            self._item(attrs),
+            *[ self._uq_item(id_val, uq_key, attrs[uq_key]) for uq_key in self.uq_keys ]
+        ]
+
+    def _put_split(self, group: List[tuple[int, Item, List[Item]]]):
+        half = len(group) // 2
+        return self._put_group(group[:half]) | self._put_group(group[half:])
+
+    def _scan_state(self, total_segments: int, checkpoint_path: str = None):
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as fr:
+                state = json.load(fr)
+            if state['total_segments'] != total_segments:
+                raise ValueError(f'Checkpoint has {state["total_segments"]} segments, expected {total_segments}')
+            return state
+        return {
+            'total_segments': total_segments,
+            'cursors': [ None ] * total_segments,
+            'done': [ False ] * total_segments,
+        }
+
+    def _sk_item(self, id_val: str, sk: str, attrs: Item, rec: RecordTimestamps):
+        keys = {
+            PK: self._id_pk(id_val),
+            SK: sk,
+        }
+        body = keys | attrs | rec
+        return self._compress(_serialize(body)['M'])
 
     def _uq_key(self, uq_key: str, uq_val: str):
         return {
@@ -150,6 +952,9 @@ class TableWithUniques:
     def _uq_pk(self, uq_key: str, uq_val: str):
         return f'{uq_key.upper()}#{uq_val}'
 
+    def batch_writer(self, thread_count: int = 4, max_pending: int = 2):
+        return BatchWriter(self, thread_count = thread_count, max_pending = max_pending)
+
     def delete(self, attrs: dict):
         del_args = {
             'TableName': self.name,
@@ -160,208 +965,429 @@ class TableWithUniques:
             self._id_key(id_val),
             *[ self._uq_key(uq_key, attrs[uq_key]) for uq_key in self.uq_keys ]
         ]
-        res = self.ddb.transact_write_items(
+        self._call('transact_write_items',
             TransactItems = [ { 'Delete': del_args | { 'Key': item } } for item in items ],
             ReturnConsumedCapacity = 'TOTAL',
         )
-        print('DDB', res['ConsumedCapacity'])
+        self._cache_invalidate(*items)
 
     def delete_sk(self, id_val: str, sk: str):
-        res = self.ddb.delete_item(
+        key = {
+            PK: _serialize(self._id_pk(id_val)),
+            SK: _serialize(sk.upper())
+        }
+        self._call('delete_item',
             TableName = self.name,
-            Key = {
-                PK: _serialize(self._id_pk(id_val)),
-                SK: _serialize(sk.upper())
-            },
+            Key = key,
             ReturnConsumedCapacity = 'TOTAL',
         )
-        print('DDB', res['ConsumedCapacity'])
+        self._cache_invalidate(key)
+
+    def export(self, sink: str | Callable[[Item], None],
+            total_segments: int = 4,
+            thread_count: int = None,
+            consistent = False,
+            page_size: int = None,
+            checkpoint_path: str = None,
+        ):
+        kwargs = {
+            'total_segments': total_segments,
+            'thread_count': thread_count,
+            'consistent': consistent,
+            'page_size': page_size,
+            'checkpoint_path': checkpoint_path,
+        }
+        count = 0
+        if callable(sink):
+            for attrs in self.scan(**kwargs):
+                sink(attrs)
+                count += 1
+            return count
+        resume = checkpoint_path is not None and os.path.exists(checkpoint_path)
+        with open(sink, 'a' if resume else 'w') as fw:
+            for attrs in self.scan(**kwargs, flush = fw.flush):
+                fw.write(json.dumps(attrs, default = _json_default) + '\n')
+                count += 1
+        return count
 
     def get(self, id_val: str, consistent = True):
-        r = self.ddb.get_item(
-            TableName = self.name,
-            Key = self._id_key(id_val),
-            ConsistentRead = consistent,
-            ReturnConsumedCapacity = 'TOTAL',
-        )
-        print('DDB', r['ConsumedCapacity'])
-        attrs = _unmarshal(r.get('Item'))
+        key = self._id_key(id_val)
+        item = self._cache_get(key, consistent)
+        if item is None:
+            r = self._call('get_item',
+                TableName = self.name,
+                Key = key,
+                ConsistentRead = consistent,
+                ReturnConsumedCapacity = 'TOTAL',
+            )
+            item = r.get('Item')
+            if item is not None:
+                self._cache_put(item)
+        attrs = _unmarshal(item, decompress = self.compressor is not None)
         attrs.pop(PK, None)
         attrs.pop(SK, None)
         attrs[self.id_key] = id_val
         return attrs
 
-    def get_many(self, id_vals: Iterable[str], consistent = True):
-        result: List[Item] = []
-        req_keys: List[Item] = []
-        kwargs = {
-            'RequestItems': {
-                self.name: {
-                    'Keys': req_keys,
-                    'ConsistentRead': consistent,
-                }
-            },
-            'ReturnConsumedCapacity': 'TOTAL',
-        }
-        id_vals_iter = iter(id_vals)
-        def fill_keys(n: int = 100):
-            batch = islice(id_vals_iter, n - len(req_keys))
-            req_keys.extend([ self._id_key(id) for id in batch ])
-        fill_keys()
-        while len(req_keys) > 0 :
-            r: dict = self.ddb.batch_get_item(**kwargs)
-            print('DDB', r['ConsumedCapacity'])
-            all_responses: dict = r.get('Responses', {})
-            responses: List[dict] = all_responses.get(self.name, [])
-            for item in responses:
-                attrs = _unmarshal(item)
-                attrs.pop(SK, None)
-                pk: str = attrs.pop(PK)
-                attrs[self.id_key] = pk.split('#')[-1]
-                result.append(attrs)
-            all_unprocessed: dict = r.get('UnprocessedKeys', {})
-            unprocessed: dict = all_unprocessed.get(self.name, {})
-            req_keys.clear()
-            req_keys.extend(unprocessed.get('Keys', []))
-            fill_keys()
-        return result
+    def get_counter(self, id_val: str, name: str, consistent = True):
+        rows = self.iterate_sk(id_val, self._counter_sk(name),
+            consistent = consistent,
+            attributes = [ 'count' ])
+        return sum(row.get('count', 0) for row in rows)
+
+    def get_many(self, id_vals: Iterable[str], consistent = True, thread_count: int = 1, lazy = False):
+        return list(self.iterate_many(id_vals, consistent = consistent, thread_count = thread_count, lazy = lazy))
 
     def get_sk(self, id_val: str, sk: str, consistent = True):
-        r = self.ddb.get_item(
-            TableName = self.name,
-            Key = {
-                PK: _serialize(self._id_pk(id_val)),
-                SK: _serialize(sk)
-            },
-            ConsistentRead = consistent,
-            ReturnConsumedCapacity = 'TOTAL',
-        )
-        print('DDB', r['ConsumedCapacity'])
-        item = r.get('Item')
+        key = {
+            PK: _serialize(self._id_pk(id_val)),
+            SK: _serialize(sk)
+        }
+        item = self._cache_get(key, consistent)
         if item is None:
-            return None
-        attrs = _unmarshal(item)
+            r = self._call('get_item',
+                TableName = self.name,
+                Key = key,
+                ConsistentRead = consistent,
+                ReturnConsumedCapacity = 'TOTAL',
+            )
+            item = r.get('Item')
+            if item is None:
+                return None
+            self._cache_put(item)
+        attrs = _unmarshal(item, decompress = self.compressor is not None)
         attrs.pop(PK, None)
         attrs.pop(SK, None)
         return attrs
 
-    def get_uq(self, uq_key: str, uq_val: str):
-        r = self.ddb.query(
+    def get_uq(self, uq_key: str, uq_val: str, consistent = True):
+        item = self._cache_get(self._uq_key(uq_key, uq_val), consistent)
+        if item is None:
+            r = self._call('query',
+                TableName = self.name,
+                KeyConditionExpression = f'{PK} = :p',
+                ExpressionAttributeValues = {
+                    ':p': _serialize(self._uq_pk(uq_key, uq_val))
+                },
+                ReturnConsumedCapacity = 'TOTAL',
+            )
+            item = r.get('Items')[0]
+            self._cache_put(item)
+        uq_item = _unmarshal(item)
+        id_val = uq_item[self.id_key]
+        return self.get(id_val, consistent = consistent)
+
+    def get_many_uq(self, uq_key: str, uq_vals: Iterable[str], consistent = True, thread_count: int = 4):
+        uq_pks = { self._uq_pk(uq_key, uq_val): uq_val for uq_val in uq_vals }
+        keys = ( self._uq_key(uq_key, uq_val) for uq_val in uq_pks.values() )
+        owners: Dict[str, List[str]] = {}
+        for item in self._iterate_keys(keys, consistent = consistent, thread_count = thread_count):
+            uq_item = _unmarshal(item)
+            owners.setdefault(uq_item[self.id_key], []).append(uq_pks[uq_item[PK]])
+        result: Dict[str, Item] = {}
+        for attrs in self.iterate_many(owners, consistent = consistent, thread_count = thread_count):
+            for uq_val in owners[attrs[self.id_key]]:
+                result[uq_val] = attrs
+        return result
+
+    def increment(self, id_val: str, name: str,
+            amount: int | Decimal = 1,
+            shards: int = COUNTER_SHARDS,
+        ):
+        key = {
+            PK: _serialize(self._id_pk(id_val)),
+            SK: _serialize(self._counter_sk(name, random.randrange(shards))),
+        }
+        self._call('update_item',
             TableName = self.name,
-            KeyConditionExpression = f'{PK} = :p',
+            Key = key,
+            UpdateExpression = 'ADD #_count :_count SET #_updated = :_updated',
+            ExpressionAttributeNames = {
+                '#_count': 'count',
+                '#_updated': 'updated',
+            },
             ExpressionAttributeValues = {
-                ':p': _serialize(self._uq_pk(uq_key, uq_val))
+                ':_count': _serialize(amount),
+                ':_updated': _serialize(_now()),
             },
             ReturnConsumedCapacity = 'TOTAL',
         )
-        print('DDB', r['ConsumedCapacity'])
-        uq_item = _unmarshal(r.get('Items')[0])
-        id_val = uq_item[self.id_key]
-        return self.get(id_val)
+        self._cache_invalidate(key)
 
-    def list_sk(self, id_val: str, sk_prefix: str, consistent = True):
-        r: dict = self.ddb.query(
-            TableName = self.name,
-            KeyConditionExpression = f'{PK} = :p AND begins_with({SK}, :s)',
-            ExpressionAttributeValues = {
+    def iterate_many(self, id_vals: Iterable[str], consistent = True, thread_count: int = 4, lazy = False):
+        keys = ( self._id_key(id) for id in id_vals )
+        for item in self._iterate_keys(keys, consistent = consistent, thread_count = thread_count):
+            yield self._id_attrs(item, lazy = lazy)
+
+    def iterate_sk(self, id_val: str, sk_prefix: str,
+            consistent = True,
+            limit: int = None,
+            page_size: int = None,
+            attributes: Iterable[str] = None,
+            start_key: Item = None,
+            lazy = False,
+        ):
+        count = 0
+        while True:
+            page_limit = page_size
+            if limit is not None:
+                page_limit = min(page_size or limit, limit - count)
+            items, start_key = self.list_sk_page(id_val, sk_prefix,
+                consistent = consistent,
+                limit = page_limit,
+                attributes = attributes,
+                start_key = start_key,
+                lazy = lazy)
+            yield from items
+            count += len(items)
+            if start_key is None or (limit is not None and count >= limit):
+                return start_key
+
+    def iterate_sk_many(self, id_vals: Iterable[str], sk_prefix: str,
+            consistent = True,
+            thread_count: int = 4,
+            limit: int = None,
+            page_size: int = None,
+            attributes: Iterable[str] = None,
+            lazy = False,
+        ):
+        assert thread_count >= 1, 'Thread count must be greater than or equal to 1'
+        if attributes is not None:
+            attributes = list(attributes)
+        def list_one(id_val: str):
+            rows = self.iterate_sk(id_val, sk_prefix,
+                consistent = consistent,
+                limit = limit,
+                page_size = page_size,
+                attributes = attributes,
+                lazy = lazy)
+            return id_val, list(rows)
+        ids = iter(dict.fromkeys(id_vals))
+        with ThreadPoolExecutor(max_workers = thread_count) as pool:
+            pending: set[Future] = set()
+            while True:
+                for id_val in islice(ids, thread_count - len(pending)):
+                    pending.add(pool.submit(list_one, id_val))
+                if len(pending) == 0:
+                    break
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def list_sk(self, id_val: str, sk_prefix: str, consistent = True, lazy = False):
+        return list(self.iterate_sk(id_val, sk_prefix, consistent = consistent, lazy = lazy))
+
+    def list_sk_many(self, id_vals: Iterable[str], sk_prefix: str,
+            consistent = True,
+            thread_count: int = 4,
+            limit: int = None,
+            page_size: int = None,
+            attributes: Iterable[str] = None,
+            lazy = False,
+        ):
+        id_vals = list(dict.fromkeys(id_vals))
+        result = dict(self.iterate_sk_many(id_vals, sk_prefix,
+            consistent = consistent,
+            thread_count = thread_count,
+            limit = limit,
+            page_size = page_size,
+            attributes = attributes,
+            lazy = lazy))
+        return { id_val: result[id_val] for id_val in id_vals }
+
+    def list_sk_page(self, id_val: str, sk_prefix: str,
+            consistent = True,
+            limit: int = None,
+            attributes: Iterable[str] = None,
+            start_key: Item = None,
+            lazy = False,
+        ):
+        kwargs = {
+            'TableName': self.name,
+            'KeyConditionExpression': f'{PK} = :p AND begins_with({SK}, :s)',
+            'ExpressionAttributeValues': {
                 ':p': _serialize(self._id_pk(id_val)),
                 ':s': _serialize(sk_prefix)
             },
-            ConsistentRead = consistent,
-            ReturnConsumedCapacity = 'TOTAL',
-        )
-        print('DDB', r['ConsumedCapacity'])
-        items: List[Item] = []
-        for item in r.get('Items', []):
-            attrs = _unmarshal(item)
-            attrs.pop(PK, None)
-            items.append(attrs)
-        return items
+            'ConsistentRead': consistent,
+            'ReturnConsumedCapacity': 'TOTAL',
+        }
+        if attributes is not None:
+            names = { f'#_{key}': key for key in dict.fromkeys([ PK, SK, *attributes ]) }
+            kwargs['ProjectionExpression'] = ', '.join(names)
+            kwargs['ExpressionAttributeNames'] = names
+        if limit is not None:
+            kwargs['Limit'] = limit
+        if start_key is not None:
+            kwargs['ExclusiveStartKey'] = start_key
+        r: dict = self._call('query', **kwargs)
+        if lazy:
+            decode = self._decoder()
+            items = [ LazyItem({ k: v for k, v in item.items() if k != PK }, decode) for item in r.get('Items', []) ]
+        else:
+            items = _unmarshal_many(r.get('Items', []), decompress = self.compressor is not None)
+            for attrs in items:
+                attrs.pop(PK, None)
+        return items, r.get('LastEvaluatedKey')
 
     def put(self, attrs: Item):
-        put_args = {
-            'TableName': self.name,
-            'ConditionExpression': f'attribute_not_exists({PK})'
-        }
-        id_val = attrs[self.id_key]
-        items = [
-            self._item(attrs),
-            *[ self._uq_item(id_val, uq_key, attrs[uq_key]) for uq_key in self.uq_keys ]
-        ]
+        items = self._put_items(attrs)
         try:
-            res = self.ddb.transact_write_items(
-                TransactItems = [ { 'Put': put_args | { 'Item': item } } for item in items ],
+            self._call('transact_write_items',
+                TransactItems = self._put_actions(items),
                 ReturnConsumedCapacity = 'TOTAL',
             )
         except self.ddb.exceptions.TransactionCanceledException as e:
-            res = e.response
-            print('TransactionCanceledException:', json.dumps(res, default = str))
-            err = {}
-            reasons = res['CancellationReasons']
-            for i, reason in enumerate(reasons):
-                code = reason['Code']
-                if code == 'None':
-                    continue
-                if code != 'ConditionalCheckFailed':
-                    raise
-                if i == 0:
-                    err[self.id_key] = f'Item with {self.id_key}={id_val} already exists'
-                else:
-                    uq_key = self.uq_keys[i - 1]
-                    uq_val = attrs[uq_key]
-                    err[uq_key] = f'Item with {uq_key}={uq_val} already exists'
-            return { 'error': err }
-        print('DDB', res['ConsumedCapacity'])
-        return { 'items': [ _unmarshal(item) for item in items ] }
+            reasons = e.response['CancellationReasons']
+            if any(reason['Code'] not in ('None', 'ConditionalCheckFailed') for reason in reasons):
+                raise
+            return { 'error': self._put_errors(attrs, reasons) }
+        self._cache_put(*items)
+        return { 'items': [ _unmarshal(item, decompress = self.compressor is not None) for item in items ] }
+
+    def put_many(self, attrs_list: Iterable[Item], thread_count: int = 4):
+        assert thread_count >= 1, 'Thread count must be greater than or equal to 1'
+        results: Dict[int, dict] = {}
+        group_size = MAX_TRANSACT_ITEMS // (1 + len(self.uq_keys))
+        entries = ( (i, attrs, self._put_items(attrs)) for i, attrs in enumerate(attrs_list) )
+        with ThreadPoolExecutor(max_workers = thread_count) as pool:
+            pending: deque[Future] = deque()
+            while True:
+                group = list(islice(entries, group_size))
+                if len(group) == 0:
+                    break
+                pending.append(pool.submit(self._put_group, group))
+                while len(pending) >= 2 * thread_count:
+                    results.update(pending.popleft().result())
+            while len(pending) > 0:
+                results.update(pending.popleft().result())
+        return [ results[i] for i in range(len(results)) ]
 
     def put_sk(self, id_val: str, sk: str, attrs: Item, ttl: timedelta = None):
         rec = new_record(ttl)
-        keys = {
-            PK: self._id_pk(id_val),
-            SK: sk,
-        }
-        body = keys | attrs | rec
-        res = self.ddb.put_item(
+        item = self._sk_item(id_val, sk, attrs, rec)
+        self._call('put_item',
             TableName = self.name,
-            Item = _serialize(body)['M'],
+            Item = item,
             ReturnConsumedCapacity = 'TOTAL',
         )
-        print('DDB', res['ConsumedCapacity'])
+        self._cache_put(item)
         return rec
 
-    def update(self, id_val: str, attrs: Item):
+    def scan(self,
+            total_segments: int = 4,
+            thread_count: int = None,
+            consistent = False,
+            page_size: int = None,
+            checkpoint_path: str = None,
+            flush: Callable[[], None] = None,
+        ):
+        state = self._scan_state(total_segments, checkpoint_path)
+        segments = [ seg for seg in range(total_segments) if not state['done'][seg] ]
+        if len(segments) == 0:
+            return
+        thread_count = thread_count or len(segments)
+        pages = Queue(maxsize = 2 * thread_count)
+        stop = Event()
+        def scan_worker(segment: int):
+            kwargs = {
+                'TableName': self.name,
+                'Segment': segment,
+                'TotalSegments': total_segments,
+                'FilterExpression': f'{SK} = :s',
+                'ExpressionAttributeValues': {
+                    ':s': _serialize(self.id_key.upper()),
+                },
+                'ConsistentRead': consistent,
+                'ReturnConsumedCapacity': 'TOTAL',
+            }
+            if page_size is not None:
+                kwargs['Limit'] = page_size
+            start_key = state['cursors'][segment]
+            while not stop.is_set():
+                if start_key is not None:
+                    kwargs['ExclusiveStartKey'] = start_key
+                r: dict = self._call('scan', **kwargs)
+                rows = [ self._id_attrs(item) for item in r.get('Items', []) ]
+                start_key = r.get('LastEvaluatedKey')
+                while not stop.is_set():
+                    try:
+                        pages.put((segment, rows, start_key), timeout = 0.1)
+                        break
+                    except QFull:
+                        continue
+                if start_key is None:
+                    break
+        with ThreadPoolExecutor(max_workers = thread_count) as pool:
+            futures = [ pool.submit(scan_worker, seg) for seg in segments ]
+            remaining = len(segments)
+            try:
+                while remaining > 0:
+                    try:
+                        segment, rows, cursor = pages.get(timeout = 0.1)
+                    except QEmpty:
+                        for future in futures:
+                            if future.done() and future.exception() is not None:
+                                raise future.exception()
+                        continue
+                    yield from rows
+                    state['cursors'][segment] = cursor
+                    if cursor is None:
+                        state['done'][segment] = True
+                        remaining -= 1
+                    if checkpoint_path is not None:
+                        if flush is not None:
+                            flush()
+                        with open(checkpoint_path + '.tmp', 'w') as fw:
+                            json.dump(state, fw)
+                        os.replace(checkpoint_path + '.tmp', checkpoint_path)
+            finally:
+                stop.set()
+
+    def update(self, id_val: str, attrs: Item, return_values: str = 'UPDATED_OLD'):
         exclude = { PK, SK, self.id_key, 'created' }
         _attrs = { k: v for k, v in attrs.items() if k not in exclude } | { 'updated': _now() }
-        acts: Dict[str, List[str]] = {}
-        names: Dict[str, str] = {}
-        values: Dict[str, Item] = {}
-        for key, val in _attrs.items():
-            names[f'#_{key}'] = key
-            if isinstance(val, UpdateAction):
-                act = val.clause.value
-                exp = val.expression(key)
-                val = val.value
-            else:
-                act = UpdateActionType.SET.value
-                exp = f'#_{key} = :_{key}'
-            acts.setdefault(act, []).append(exp)
-            values[f':_{key}'] = _serialize(val)
-        exps = [ f'{k} ' + ', '.join(v) for k, v in acts.items() ]
-        print('UPDATE:names', names)
-        print('UPDATE:exps', exps)
-        print('UPDATE:vals', values)
-        res = self.ddb.update_item(
+        shape = tuple(( key, val.shape if isinstance(val, UpdateAction) else None ) for key, val in _attrs.items())
+        template = self.update_templates.get(shape)
+        if template is None:
+            template = _update_template(_attrs)
+            if len(self.update_templates) >= UPDATE_TEMPLATES_MAX:
+                self.update_templates.clear()
+            self.update_templates[shape] = template
+        exp, names = template
+        values = {
+            f':_{key}': _serialize(val.value) if isinstance(val, UpdateAction) else self._compress_value(key, val)
+            for key, val in _attrs.items()
+        }
+        key = self._id_key(id_val)
+        res = self._call('update_item',
             TableName = self.name,
-            Key = self._id_key(id_val),
-            UpdateExpression = '\n'.join(exps),
+            Key = key,
+            UpdateExpression = exp,
             ExpressionAttributeNames = names,
             ExpressionAttributeValues = values,
             ConditionExpression = f'attribute_exists({PK})',
-            ReturnValues = 'UPDATED_OLD', # ALL_NEW, UPDATED_OLD, NONE, ALL_OLD
+            ReturnValues = return_values, # ALL_NEW, UPDATED_OLD, NONE, ALL_OLD
             ReturnConsumedCapacity = 'TOTAL',
         )
-        print('DDB', res['ConsumedCapacity'])
-        return _unmarshal(res['Attributes'])
+        self._cache_invalidate(key)
+        return _unmarshal(res.get('Attributes'), decompress = self.compressor is not None)
+
+    def update_many(self, updates: Iterable[tuple[str, Item]],
+            thread_count: int = 4,
+            return_values: str = 'NONE',
+        ):
+        assert thread_count >= 1, 'Thread count must be greater than or equal to 1'
+        results = []
+        with ThreadPoolExecutor(max_workers = thread_count) as pool:
+            pending: deque[Future] = deque()
+            for id_val, attrs in updates:
+                pending.append(pool.submit(self.update, id_val, attrs, return_values = return_values))
+                while len(pending) >= 2 * thread_count:
+                    results.append(pending.popleft().result())
+            while len(pending) > 0:
+                results.append(pending.popleft().result())
+        return results
 
     def update_uq(self, id_val: str, uq_key: str, uq_new: str, uq_old: str):
         put_new_value = {
@@ -390,10 +1416,10 @@ class TableWithUniques:
         delete_old_value = {
             'Delete': {
                 'TableName': self.name,
-                'Key': self._uq_item(id_val, uq_key, uq_old),
+                'Key': self._uq_key(uq_key, uq_old),
             }
         }
-        res = self.ddb.transact_write_items(
+        self._call('transact_write_items',
             TransactItems = [
                 put_new_value,
                 update_owner_item,
@@ -401,4 +1427,156 @@ class TableWithUniques:
             ],
             ReturnConsumedCapacity = 'TOTAL',
         )
-        print('DDB', res['ConsumedCapacity'])
+        self._cache_invalidate(self._id_key(id_val), self._uq_key(uq_key, uq_old))
+        self._cache_put(put_new_value['Put']['Item'])
+
+class BatchWriter:
+
+    def __init__(self, table: TableWithUniques, thread_count: int = 4, max_pending: int = 2):
+        assert thread_count >= 1, 'Thread count must be greater than or equal to 1'
+        self.table = table
+        self.thread_count = thread_count
+        self.max_pending = max_pending
+        self.buffers: List[Dict[tuple, Item]] = [ {} for _ in range(thread_count) ]
+        self.lock = Lock()
+        self.lanes: List[ThreadPoolExecutor] = []
+        self.pending: List[List[Future]] = [ [] for _ in range(thread_count) ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            for lane in self.lanes:
+                lane.shutdown(wait = True, cancel_futures = exc_type is not None)
+            self.lanes = []
+
+    def _add(self, key: tuple, request: Item):
+        lane = hash(key) % self.thread_count
+        with self.lock:
+            buffer = self.buffers[lane]
+            # batch_write_item rejects duplicate keys in one request, so the last write wins
+            buffer.pop(key, None)
+            buffer[key] = request
+            if self.table.cache is not None:
+                self.table.cache.invalidate(key)
+            if len(buffer) >= BATCH_WRITE_SIZE:
+                self._submit(lane)
+
+    def _submit(self, lane: int):
+        buffer = self.buffers[lane]
+        requests = list(buffer.values())
+        keys = list(buffer)
+        buffer.clear()
+        if not self.lanes:
+            # one single-threaded lane per worker keeps writes to the same key in order
+            self.lanes = [ ThreadPoolExecutor(max_workers = 1) for _ in range(self.thread_count) ]
+        pending = self.pending[lane]
+        pending.append(self.lanes[lane].submit(self._write, keys, requests))
+        while len(pending) > self.max_pending or (len(pending) > 0 and pending[0].done()):
+            pending.pop(0).result()
+
+    def _write(self, keys: List[tuple], requests: List[Item]):
+        try:
+            self.table._batch_write(requests)
+        finally:
+            # reads made while the batch was buffered may have cached the old rows
+            if self.table.cache is not None:
+                self.table.cache.invalidate(*keys)
+
+    def delete_sk(self, id_val: str, sk: str):
+        pk = self.table._id_pk(id_val)
+        sk = sk.upper()
+        self._add((pk, sk), {
+            'DeleteRequest': {
+                'Key': {
+                    PK: _serialize(pk),
+                    SK: _serialize(sk),
+                }
+            }
+        })
+
+    def flush(self):
+        with self.lock:
+            for lane in range(self.thread_count):
+                if len(self.buffers[lane]) > 0:
+                    self._submit(lane)
+            pending = [ future for lane_pending in self.pending for future in lane_pending ]
+            for lane_pending in self.pending:
+                lane_pending.clear()
+        for future in pending:
+            future.result()
+
+    def put_sk(self, id_val: str, sk: str, attrs: Item, ttl: timedelta = None):
+        rec = new_record(ttl)
+        self._add((self.table._id_pk(id_val), sk), {
+            'PutRequest': {
+                'Item': self.table._sk_item(id_val, sk, attrs, rec),
+            }
+        })
+        return rec
+
+class CounterAccumulator:
+
+    def __init__(self, table: TableWithUniques,
+            shards: int = COUNTER_SHARDS,
+            flush_interval: float = 1.0,
+        ):
+        self.table = table
+        self.shards = shards
+        self.flush_interval = flush_interval
+        self.pending: Dict[tuple[str, str], int | Decimal] = {}
+        self.lock = Lock()
+        self.stop = Event()
+        self.thread = Thread(
+            target = self.monitor,
+            daemon = True,
+            name = f'ddb-counters-{table.name}',
+        )
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, id_val: str, name: str, amount: int | Decimal = 1):
+        with self.lock:
+            key = (id_val, name)
+            self.pending[key] = self.pending.get(key, 0) + amount
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        items = iter(pending.items())
+        try:
+            for (id_val, name), amount in items:
+                if amount != 0:
+                    self.table.increment(id_val, name, amount = amount, shards = self.shards)
+        except Exception:
+            # put back whatever was not written so the next flush retries it
+            remaining = [ ((id_val, name), amount) ] + list(items)
+            for key, amount in remaining:
+                self.add(*key, amount = amount)
+            raise
+
+    def get(self, id_val: str, name: str, consistent = True):
+        with self.lock:
+            local = self.pending.get((id_val, name), 0)
+        return self.table.get_counter(id_val, name, consistent = consistent) + local
+
+    def monitor(self):
+        while not self.stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f'failed to flush counters: {e}')
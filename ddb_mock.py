@@ -0,0 +1,679 @@
+# Standard
+from bisect import bisect_left, bisect_right, insort
+from decimal import Decimal
+import math
+import random
+import re
+from threading import RLock
+import time
+from typing import Callable, Dict, Iterable, List
+# External
+from botocore.exceptions import ClientError
+# Internal
+from .ddb import PK, SK, Item
+
+READ_UNIT = 4096
+WRITE_UNIT = 1024
+PAGE_BYTES = 1024 * 1024
+
+CLAUSE_RE = re.compile(r'\b(SET|ADD|REMOVE|DELETE)\b')
+COMPARE_RE = re.compile(r'^(.+?)\s*(<>|<=|>=|=|<|>)\s*(.+)$')
+FUNCTION_RE = re.compile(r'^(\w+)\s*\((.*)\)$', re.S)
+
+class ConditionalCheckFailedException(ClientError):
+    pass
+
+class TransactionCanceledException(ClientError):
+    pass
+
+class MockExceptions:
+    ClientError = ClientError
+    ConditionalCheckFailedException = ConditionalCheckFailedException
+    TransactionCanceledException = TransactionCanceledException
+
+def _error(operation: str, code: str, message: str,
+        cls: type = ClientError,
+        **extra):
+    return cls({ 'Error': { 'Code': code, 'Message': message }, **extra }, operation)
+
+def _validation(operation: str, message: str):
+    return _error(operation, 'ValidationException', message)
+
+def _scalar(v: dict):
+    for t, x in v.items():
+        if t == 'N':
+            return (t, Decimal(x))
+        if t in ('SS', 'NS', 'BS'):
+            return (t, frozenset(x))
+        if t in ('L', 'M'):
+            return (t, repr(x))
+        return (t, x)
+
+def _size(v: dict) -> int:
+    for t, x in v.items():
+        if t == 'S':
+            return len(x.encode())
+        if t == 'N':
+            return len(x.lstrip('-').replace('.', '')) // 2 + 2
+        if t == 'B':
+            return len(x)
+        if t in ('BOOL', 'NULL'):
+            return 1
+        if t == 'SS':
+            return sum(len(s.encode()) for s in x)
+        if t == 'NS':
+            return sum(_size({ 'N': n }) for n in x)
+        if t == 'BS':
+            return sum(len(b) for b in x)
+        if t == 'L':
+            return 3 + sum(1 + _size(y) for y in x)
+        if t == 'M':
+            return 3 + sum(1 + len(k.encode()) + _size(y) for k, y in x.items())
+    return 0
+
+def _item_size(item: Item):
+    return sum(len(k.encode()) + _size(v) for k, v in item.items()) if item else 0
+
+def _split_top(expr: str, sep: str = ','):
+    parts = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(expr):
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == sep and depth == 0:
+            parts.append(expr[start:i].strip())
+            start = i + 1
+    parts.append(expr[start:].strip())
+    return [ p for p in parts if p != '' ]
+
+def _split_words(expr: str, word: str):
+    parts = []
+    depth = 0
+    start = 0
+    pattern = re.compile(rf'\s+{word}\s+', re.I)
+    i = 0
+    while i < len(expr):
+        c = expr[i]
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif depth == 0:
+            m = pattern.match(expr, i)
+            if m is not None:
+                parts.append(expr[start:i].strip())
+                i = start = m.end()
+                continue
+        i += 1
+    parts.append(expr[start:].strip())
+    return parts
+
+def _closing(expr: str, start: int = 0):
+    depth = 0
+    for i in range(start, len(expr)):
+        if expr[i] == '(':
+            depth += 1
+        elif expr[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+def _unwrap(expr: str):
+    expr = expr.strip()
+    while expr.startswith('(') and _closing(expr) == len(expr) - 1:
+        expr = expr[1:-1].strip()
+    return expr
+
+class Expression:
+
+    def __init__(self, names: Dict[str, str] = None, values: Dict[str, dict] = None):
+        self.names = names or {}
+        self.values = values or {}
+
+    def name(self, token: str):
+        token = token.strip()
+        return self.names[token] if token.startswith('#') else token
+
+    def existing(self, token: str, item: Item):
+        value = self.operand(token, item)
+        if value is None:
+            raise _validation('UpdateItem', 'The provided expression refers to an attribute that does not exist in the item')
+        return value
+
+    def operand(self, token: str, item: Item):
+        token = token.strip()
+        if token.startswith(':'):
+            return self.values[token]
+        m = FUNCTION_RE.match(token)
+        if m is not None:
+            func, args = m.group(1), _split_top(m.group(2))
+            if func == 'list_append':
+                a, b = [ self.existing(arg, item) for arg in args ]
+                return { 'L': a['L'] + b['L'] }
+            if func == 'if_not_exists':
+                current = item.get(self.name(args[0]))
+                return current if current is not None else self.operand(args[1], item)
+            if func == 'size':
+                return { 'N': str(_size(self.operand(args[0], item))) }
+            raise ValueError(f'Unsupported function {func}')
+        for op in (' + ', ' - '):
+            if op in token:
+                a, b = token.split(op, 1)
+                x = Decimal(self.existing(a, item)['N'])
+                y = Decimal(self.existing(b, item)['N'])
+                return { 'N': str(x + y if op == ' + ' else x - y) }
+        return item.get(self.name(token))
+
+    def condition(self, expr: str, item: Item) -> bool:
+        expr = _unwrap(expr)
+        ors = _split_words(expr, 'OR')
+        if len(ors) > 1:
+            return any(self.condition(e, item) for e in ors)
+        ands = _split_words(expr, 'AND')
+        if len(ands) > 1:
+            return all(self.condition(e, item) for e in ands)
+        if expr.upper().startswith('NOT '):
+            return not self.condition(expr[4:], item)
+        m = FUNCTION_RE.match(expr)
+        if m is not None:
+            func, args = m.group(1), _split_top(m.group(2))
+            if func == 'attribute_exists':
+                return self.name(args[0]) in item
+            if func == 'attribute_not_exists':
+                return self.name(args[0]) not in item
+            if func == 'begins_with':
+                value = self.operand(args[0], item)
+                prefix = self.operand(args[1], item)
+                return value is not None and _scalar(value)[1].startswith(_scalar(prefix)[1])
+            if func == 'contains':
+                value = self.operand(args[0], item)
+                member = self.operand(args[1], item)
+                if value is None:
+                    return False
+                for t, x in value.items():
+                    if t == 'S':
+                        return member['S'] in x
+                    if t == 'L':
+                        return member in x
+                    return _scalar(member)[1] in _scalar(value)[1]
+            raise ValueError(f'Unsupported function {func}')
+        m = COMPARE_RE.match(expr)
+        if m is None:
+            raise ValueError(f'Unsupported condition {expr}')
+        a = self.operand(m.group(1), item)
+        b = self.operand(m.group(3), item)
+        op = m.group(2)
+        if a is None or b is None:
+            return op == '<>' and a != b
+        x, y = _scalar(a), _scalar(b)
+        if op == '=':
+            return x == y
+        if op == '<>':
+            return x != y
+        if x[0] != y[0]:
+            return False
+        return {
+            '<': x[1] < y[1],
+            '<=': x[1] <= y[1],
+            '>': x[1] > y[1],
+            '>=': x[1] >= y[1],
+        }[op]
+
+    def projection(self, expr: str, item: Item):
+        keys = [ self.name(token) for token in _split_top(expr) ]
+        return { k: item[k] for k in keys if k in item }
+
+    def update(self, expr: str, item: Item):
+        parts = CLAUSE_RE.split(expr)
+        for clause, body in zip(parts[1::2], parts[2::2]):
+            for action in _split_top(body):
+                if clause == 'SET':
+                    path, value = action.split('=', 1)
+                    item[self.name(path)] = self.operand(value, item)
+                elif clause == 'REMOVE':
+                    item.pop(self.name(action), None)
+                else:
+                    path, value = action.split(None, 1)
+                    key = self.name(path)
+                    self._add(item, key, self.operand(value, item), clause == 'DELETE')
+
+    def _add(self, item: Item, key: str, value: dict, delete: bool):
+        current = item.get(key)
+        for t, x in value.items():
+            if t == 'N' and not delete:
+                base = Decimal(current['N']) if current is not None else Decimal(0)
+                item[key] = { 'N': str(base + Decimal(x)) }
+                return
+            if t in ('SS', 'NS', 'BS'):
+                members = list(current[t]) if current is not None else []
+                if delete:
+                    members = [ m for m in members if m not in x ]
+                else:
+                    members.extend(m for m in x if m not in members)
+                if len(members) > 0:
+                    item[key] = { t: members }
+                else:
+                    item.pop(key, None)
+                return
+            raise ValueError(f'Unsupported {"DELETE" if delete else "ADD"} type {t}')
+
+class Partition:
+
+    def __init__(self):
+        self.items: Dict[tuple, Item] = {}
+        self.order: List[tuple] = []
+
+    def delete(self, sk: tuple):
+        item = self.items.pop(sk, None)
+        if item is not None:
+            self.order.pop(bisect_left(self.order, sk))
+        return item
+
+    def put(self, sk: tuple, item: Item):
+        if sk not in self.items:
+            insort(self.order, sk)
+        self.items[sk] = item
+
+class MockDynamoDB:
+
+    def __init__(self,
+            pk: str = PK,
+            sk: str = SK,
+            unprocessed_rate: float = 0.0,
+            latency: float = 0.0,
+            seed: int = None,
+        ):
+        self.pk = pk
+        self.sk = sk
+        self.unprocessed_rate = unprocessed_rate
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.tables: Dict[str, Dict[tuple, Partition]] = {}
+        self.lock = RLock()
+        self.calls: Dict[str, int] = {}
+        self.exceptions = MockExceptions
+
+    def _begin(self, operation: str):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _capacity(self, name: str, units: float, mode: str):
+        if mode not in ('TOTAL', 'INDEXES'):
+            return None
+        return { 'TableName': name, 'CapacityUnits': units }
+
+    def _key(self, operation: str, key: Item):
+        if set(key) != { self.pk, self.sk }:
+            raise _validation(operation, 'The provided key element does not match the schema')
+        return _scalar(key[self.pk]), _scalar(key[self.sk])
+
+    def _get(self, name: str, pk: tuple, sk: tuple):
+        partition = self.tables.get(name, {}).get(pk)
+        return partition.items.get(sk) if partition is not None else None
+
+    def _put(self, name: str, item: Item):
+        pk, sk = _scalar(item[self.pk]), _scalar(item[self.sk])
+        self.tables.setdefault(name, {}).setdefault(pk, Partition()).put(sk, item)
+
+    def _delete(self, name: str, pk: tuple, sk: tuple):
+        partitions = self.tables.get(name, {})
+        partition = partitions.get(pk)
+        if partition is None:
+            return None
+        item = partition.delete(sk)
+        if len(partition.items) == 0:
+            del partitions[pk]
+        return item
+
+    def _check(self, kwargs: dict, item: Item):
+        expr = kwargs.get('ConditionExpression')
+        if expr is None:
+            return True
+        ex = Expression(kwargs.get('ExpressionAttributeNames'), kwargs.get('ExpressionAttributeValues'))
+        return ex.condition(expr, item or {})
+
+    def _read_units(self, size: int, consistent: bool):
+        units = max(1, math.ceil(size / READ_UNIT))
+        return units if consistent else units / 2
+
+    def _write_units(self, *sizes: int):
+        return max(1, math.ceil(max(sizes) / WRITE_UNIT))
+
+    def _updated(self, kwargs: dict, old: Item):
+        new = { k: v for k, v in (old or {}).items() }
+        if old is None:
+            new.update(kwargs['Key'])
+        ex = Expression(kwargs.get('ExpressionAttributeNames'), kwargs.get('ExpressionAttributeValues'))
+        ex.update(kwargs['UpdateExpression'], new)
+        return new
+
+    def batch_get_item(self, RequestItems: Dict[str, dict], ReturnConsumedCapacity: str = 'NONE'):
+        self._begin('batch_get_item')
+        if sum(len(req['Keys']) for req in RequestItems.values()) > 100:
+            raise _validation('BatchGetItem', 'Too many items requested for the BatchGetItem call')
+        responses: Dict[str, List[Item]] = {}
+        unprocessed: Dict[str, dict] = {}
+        consumed = []
+        with self.lock:
+            for name, req in RequestItems.items():
+                keys = [ self._key('BatchGetItem', key) for key in req['Keys'] ]
+                if len(set(keys)) < len(keys):
+                    raise _validation('BatchGetItem', 'Provided list of item keys contains duplicates')
+                consistent = req.get('ConsistentRead', False)
+                units = 0.0
+                for key, (pk, sk) in zip(req['Keys'], keys):
+                    if self.random.random() < self.unprocessed_rate:
+                        unprocessed.setdefault(name, { k: v for k, v in req.items() if k != 'Keys' } | { 'Keys': [] })['Keys'].append(key)
+                        continue
+                    item = self._get(name, pk, sk)
+                    units += self._read_units(_item_size(item), consistent)
+                    if item is not None:
+                        if 'ProjectionExpression' in req:
+                            ex = Expression(req.get('ExpressionAttributeNames'))
+                            item = ex.projection(req['ProjectionExpression'], item)
+                        responses.setdefault(name, []).append(item)
+                consumed.append(self._capacity(name, units, ReturnConsumedCapacity))
+        res = { 'Responses': responses, 'UnprocessedKeys': unprocessed }
+        if ReturnConsumedCapacity != 'NONE':
+            res['ConsumedCapacity'] = consumed
+        return res
+
+    def batch_write_item(self, RequestItems: Dict[str, List[dict]], ReturnConsumedCapacity: str = 'NONE'):
+        self._begin('batch_write_item')
+        if sum(len(reqs) for reqs in RequestItems.values()) > 25:
+            raise _validation('BatchWriteItem', 'Too many items requested for the BatchWriteItem call')
+        unprocessed: Dict[str, List[dict]] = {}
+        consumed = []
+        with self.lock:
+            for name, reqs in RequestItems.items():
+                keys = []
+                for req in reqs:
+                    if 'PutRequest' in req:
+                        item = req['PutRequest']['Item']
+                        keys.append(self._key('BatchWriteItem', { self.pk: item[self.pk], self.sk: item[self.sk] }))
+                    else:
+                        keys.append(self._key('BatchWriteItem', req['DeleteRequest']['Key']))
+                if len(set(keys)) < len(keys):
+                    raise _validation('BatchWriteItem', 'Provided list of item keys contains duplicates')
+                units = 0.0
+                for req, (pk, sk) in zip(reqs, keys):
+                    if self.random.random() < self.unprocessed_rate:
+                        unprocessed.setdefault(name, []).append(req)
+                        continue
+                    old = self._get(name, pk, sk)
+                    if 'PutRequest' in req:
+                        item = req['PutRequest']['Item']
+                        self._put(name, item)
+                        units += self._write_units(_item_size(old), _item_size(item))
+                    else:
+                        self._delete(name, pk, sk)
+                        units += self._write_units(_item_size(old))
+                consumed.append(self._capacity(name, units, ReturnConsumedCapacity))
+        res = { 'UnprocessedItems': unprocessed }
+        if ReturnConsumedCapacity != 'NONE':
+            res['ConsumedCapacity'] = consumed
+        return res
+
+    def delete_item(self, TableName: str, Key: Item,
+            ReturnConsumedCapacity: str = 'NONE',
+            ReturnValues: str = 'NONE',
+            **kwargs):
+        self._begin('delete_item')
+        pk, sk = self._key('DeleteItem', Key)
+        with self.lock:
+            old = self._get(TableName, pk, sk)
+            if not self._check(kwargs, old):
+                raise _error('DeleteItem', 'ConditionalCheckFailedException', 'The conditional request failed',
+                    cls = ConditionalCheckFailedException)
+            self._delete(TableName, pk, sk)
+        res = {}
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            res['Attributes'] = old
+        capacity = self._capacity(TableName, self._write_units(_item_size(old)), ReturnConsumedCapacity)
+        if capacity is not None:
+            res['ConsumedCapacity'] = capacity
+        return res
+
+    def get_item(self, TableName: str, Key: Item,
+            ConsistentRead: bool = False,
+            ReturnConsumedCapacity: str = 'NONE',
+            ProjectionExpression: str = None,
+            ExpressionAttributeNames: Dict[str, str] = None):
+        self._begin('get_item')
+        pk, sk = self._key('GetItem', Key)
+        with self.lock:
+            item = self._get(TableName, pk, sk)
+        res = {}
+        if item is not None:
+            if ProjectionExpression is not None:
+                item = Expression(ExpressionAttributeNames).projection(ProjectionExpression, item)
+            res['Item'] = item
+        capacity = self._capacity(TableName, self._read_units(_item_size(item), ConsistentRead), ReturnConsumedCapacity)
+        if capacity is not None:
+            res['ConsumedCapacity'] = capacity
+        return res
+
+    def put_item(self, TableName: str, Item: Item,
+            ReturnConsumedCapacity: str = 'NONE',
+            ReturnValues: str = 'NONE',
+            **kwargs):
+        self._begin('put_item')
+        pk, sk = self._key('PutItem', { self.pk: Item[self.pk], self.sk: Item[self.sk] })
+        with self.lock:
+            old = self._get(TableName, pk, sk)
+            if not self._check(kwargs, old):
+                raise _error('PutItem', 'ConditionalCheckFailedException', 'The conditional request failed',
+                    cls = ConditionalCheckFailedException)
+            self._put(TableName, Item)
+        res = {}
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            res['Attributes'] = old
+        capacity = self._capacity(TableName, self._write_units(_item_size(old), _item_size(Item)), ReturnConsumedCapacity)
+        if capacity is not None:
+            res['ConsumedCapacity'] = capacity
+        return res
+
+    def query(self, TableName: str, KeyConditionExpression: str,
+            ExpressionAttributeValues: Dict[str, dict] = None,
+            ExpressionAttributeNames: Dict[str, str] = None,
+            ConsistentRead: bool = False,
+            ReturnConsumedCapacity: str = 'NONE',
+            ProjectionExpression: str = None,
+            FilterExpression: str = None,
+            Limit: int = None,
+            ExclusiveStartKey: Item = None,
+            ScanIndexForward: bool = True):
+        self._begin('query')
+        ex = Expression(ExpressionAttributeNames, ExpressionAttributeValues)
+        pk = None
+        sk_conditions = []
+        for term in _split_words(_unwrap(KeyConditionExpression), 'AND'):
+            m = COMPARE_RE.match(_unwrap(term))
+            if m is not None and m.group(2) == '=' and ex.name(m.group(1)) == self.pk:
+                pk = _scalar(ex.operand(m.group(3), {}))
+            else:
+                sk_conditions.append(term)
+        if pk is None:
+            raise _validation('Query', 'Query condition missed key schema element')
+        with self.lock:
+            partition = self.tables.get(TableName, {}).get(pk)
+            order = list(partition.order) if partition is not None else []
+            if not ScanIndexForward:
+                order.reverse()
+            if ExclusiveStartKey is not None:
+                start = _scalar(ExclusiveStartKey[self.sk])
+                if ScanIndexForward:
+                    order = order[bisect_right(order, start):]
+                else:
+                    order = [ sk for sk in order if sk < start ]
+            items, scanned, size, last = self._page(
+                ( partition.items[sk] for sk in order ),
+                lambda item: all(ex.condition(c, item) for c in sk_conditions),
+                Limit)
+        return self._read_response(TableName, items, scanned, size, last, ex,
+            FilterExpression, ProjectionExpression, ConsistentRead, ReturnConsumedCapacity)
+
+    def _page(self, candidates: Iterable[Item], match: Callable[[Item], bool], limit: int = None):
+        items = []
+        size = 0
+        last = None
+        for item in candidates:
+            if not match(item):
+                continue
+            items.append(item)
+            size += _item_size(item)
+            if (limit is not None and len(items) >= limit) or size >= PAGE_BYTES:
+                last = item
+                break
+        return items, len(items), size, last
+
+    def _read_response(self, name: str, items: List[Item], scanned: int, size: int, last: Item,
+            ex: Expression,
+            filter_expr: str,
+            projection: str,
+            consistent: bool,
+            mode: str):
+        if filter_expr is not None:
+            items = [ item for item in items if ex.condition(filter_expr, item) ]
+        if projection is not None:
+            items = [ ex.projection(projection, item) for item in items ]
+        res = {
+            'Items': items,
+            'Count': len(items),
+            'ScannedCount': scanned,
+        }
+        if last is not None:
+            res['LastEvaluatedKey'] = { self.pk: last[self.pk], self.sk: last[self.sk] }
+        capacity = self._capacity(name, self._read_units(size, consistent), mode)
+        if capacity is not None:
+            res['ConsumedCapacity'] = capacity
+        return res
+
+    def scan(self, TableName: str,
+            ExpressionAttributeValues: Dict[str, dict] = None,
+            ExpressionAttributeNames: Dict[str, str] = None,
+            ConsistentRead: bool = False,
+            ReturnConsumedCapacity: str = 'NONE',
+            ProjectionExpression: str = None,
+            FilterExpression: str = None,
+            Limit: int = None,
+            ExclusiveStartKey: Item = None,
+            Segment: int = 0,
+            TotalSegments: int = 1):
+        self._begin('scan')
+        ex = Expression(ExpressionAttributeNames, ExpressionAttributeValues)
+        with self.lock:
+            partitions = self.tables.get(TableName, {})
+            keys = sorted(
+                (pk, sk)
+                for pk, partition in partitions.items()
+                if hash(pk) % TotalSegments == Segment
+                for sk in partition.order
+            )
+            if ExclusiveStartKey is not None:
+                start = (_scalar(ExclusiveStartKey[self.pk]), _scalar(ExclusiveStartKey[self.sk]))
+                keys = keys[bisect_right(keys, start):]
+            items, scanned, size, last = self._page(
+                ( partitions[pk].items[sk] for pk, sk in keys ),
+                lambda item: True,
+                Limit)
+            if last is not None and keys[-1] == (_scalar(last[self.pk]), _scalar(last[self.sk])):
+                last = None
+        return self._read_response(TableName, items, scanned, size, last, ex,
+            FilterExpression, ProjectionExpression, ConsistentRead, ReturnConsumedCapacity)
+
+    def transact_write_items(self, TransactItems: List[dict], ReturnConsumedCapacity: str = 'NONE', **kwargs):
+        self._begin('transact_write_items')
+        if len(TransactItems) > 100:
+            raise _validation('TransactWriteItems', 'Member must have length less than or equal to 100')
+        actions = []
+        for action in TransactItems:
+            (kind, args), = action.items()
+            if kind == 'Put':
+                key = { self.pk: args['Item'][self.pk], self.sk: args['Item'][self.sk] }
+            else:
+                key = args['Key']
+            actions.append((kind, args, self._key('TransactWriteItems', key)))
+        if len(set((args['TableName'], key) for _, args, key in actions)) < len(actions):
+            raise _validation('TransactWriteItems', 'Transaction request cannot include multiple operations on one item')
+        with self.lock:
+            reasons = []
+            for kind, args, (pk, sk) in actions:
+                old = self._get(args['TableName'], pk, sk)
+                if self._check(args, old):
+                    reasons.append({ 'Code': 'None' })
+                else:
+                    reasons.append({ 'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed' })
+            if any(reason['Code'] != 'None' for reason in reasons):
+                raise _error('TransactWriteItems', 'TransactionCanceledException',
+                    f'Transaction cancelled, please refer cancellation reasons for specific reasons [{", ".join(r["Code"] for r in reasons)}]',
+                    cls = TransactionCanceledException,
+                    CancellationReasons = reasons)
+            units: Dict[str, float] = {}
+            for kind, args, (pk, sk) in actions:
+                name = args['TableName']
+                old = self._get(name, pk, sk)
+                if kind == 'Put':
+                    new = args['Item']
+                    self._put(name, new)
+                elif kind == 'Delete':
+                    new = None
+                    self._delete(name, pk, sk)
+                elif kind == 'Update':
+                    new = self._updated(args, old)
+                    self._put(name, new)
+                else:
+                    new = None
+                units[name] = units.get(name, 0) + 2 * self._write_units(_item_size(old), _item_size(new))
+        res = {}
+        if ReturnConsumedCapacity != 'NONE':
+            res['ConsumedCapacity'] = [ self._capacity(name, u, ReturnConsumedCapacity) for name, u in units.items() ]
+        return res
+
+    def update_item(self, TableName: str, Key: Item, UpdateExpression: str,
+            ExpressionAttributeNames: Dict[str, str] = None,
+            ExpressionAttributeValues: Dict[str, dict] = None,
+            ConditionExpression: str = None,
+            ReturnValues: str = 'NONE',
+            ReturnConsumedCapacity: str = 'NONE'):
+        self._begin('update_item')
+        kwargs = {
+            'Key': Key,
+            'UpdateExpression': UpdateExpression,
+            'ExpressionAttributeNames': ExpressionAttributeNames,
+            'ExpressionAttributeValues': ExpressionAttributeValues,
+            'ConditionExpression': ConditionExpression,
+        }
+        pk, sk = self._key('UpdateItem', Key)
+        with self.lock:
+            old = self._get(TableName, pk, sk)
+            if not self._check(kwargs, old):
+                raise _error('UpdateItem', 'ConditionalCheckFailedException', 'The conditional request failed',
+                    cls = ConditionalCheckFailedException)
+            new = self._updated(kwargs, old)
+            self._put(TableName, new)
+        res = {}
+        old = old or {}
+        changed = { k for k in set(old) | set(new) if old.get(k) != new.get(k) }
+        if ReturnValues == 'ALL_OLD' and len(old) > 0:
+            res['Attributes'] = old
+        elif ReturnValues == 'ALL_NEW':
+            res['Attributes'] = new
+        elif ReturnValues == 'UPDATED_OLD':
+            attrs = { k: old[k] for k in changed if k in old }
+            if len(attrs) > 0:
+                res['Attributes'] = attrs
+        elif ReturnValues == 'UPDATED_NEW':
+            attrs = { k: new[k] for k in changed if k in new }
+            if len(attrs) > 0:
+                res['Attributes'] = attrs
+        capacity = self._capacity(TableName, self._write_units(_item_size(old), _item_size(new)), ReturnConsumedCapacity)
+        if capacity is not None:
+            res['ConsumedCapacity'] = capacity
+        return res
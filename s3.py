@@ -1,14 +1,37 @@
 # Standard
+from base64 import b64encode
+import bz2
 from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import csv
 from enum import Enum
+import hashlib
+from itertools import islice
+import json
+import mmap
 import os
-from queue import Queue, Empty as QEmpty
-from threading import Thread
-from typing import Any, Callable, Dict, Iterable, List
+from queue import Queue, Full as QFull
+import random
+import tempfile
+from threading import Event, Lock, get_ident
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+import zlib
 # External
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
+from botocore.exceptions import ClientError
 from botocore.response import StreamingBody
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 # Internal
 from . import enval
 
@@ -21,16 +44,351 @@ class ClientMethod(Enum):
     DEL = 'delete_object'
     HEAD = 'head_object'
 
+class Compression(Enum):
+    NONE = 'none'
+    GZIP = 'gzip'
+    BZ2 = 'bz2'
+    ZSTD = 'zstd'
+
+class RecordFormat(Enum):
+    JSONL = 'jsonl'
+    CSV = 'csv'
+
 class RestoreTier(Enum):
     BLK = 'Bulk'
     STD = 'Standard'
     XPD = 'Expedited'
 
+class ShardBy(Enum):
+    PREFIX = 'prefix'
+    RANGE = 'range'
+
 class StorageClass(Enum):
     STD = 'Standard'
     GLR = 'Glacier'
 
+SHARD_CHARS = '-./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
 SCALE_PREFIX = [ '', 'K', 'M', 'G', 'T', 'P', 'E', 'Z' ]
+DELETE_BATCH_SIZE = 1000
+DELETE_RETRIES = 5
+RETRY_CODES = { 'InternalError', 'OperationAborted', 'RequestTimeout', 'ServiceUnavailable', 'SlowDown' }
+BACKOFF_BASE = 0.1
+BACKOFF_CAP = 5.0
+MTIME_META = 'mtime'
+HASH_CHUNK_SIZE = 1024 * 1024
+RANGE_PART_SIZE = 8 * 1024 * 1024
+KMS_ENCRYPTION = { 'aws:kms', 'aws:kms:dsse' }
+STREAM_CHUNK_SIZE = 1024 * 1024
+STREAM_QUEUE_SIZE = 4
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+MULTIPART_MIN_PART_SIZE = 5 * 1024 * 1024
+MULTIPART_MAX_PARTS = 10000
+READ_CACHE_BYTES = 256 * 1024 * 1024
+READ_CACHE_TMP_TTL = 3600
+NOT_MODIFIED_CODES = { '304', 'NotModified' }
+COMPRESSION_EXTENSIONS = {
+    '.gz': Compression.GZIP,
+    '.gzip': Compression.GZIP,
+    '.bz2': Compression.BZ2,
+    '.zst': Compression.ZSTD,
+    '.zstd': Compression.ZSTD,
+}
+
+class DeleteStats:
+
+    def __init__(self):
+        self.lock = Lock()
+        self.listed = 0
+        self.deleted = 0
+        self.failed = 0
+        self.retried = 0
+
+    def __repr__(self):
+        return f'DeleteStats(listed={self.listed}, deleted={self.deleted}, failed={self.failed}, retried={self.retried})'
+
+    def add(self, listed: int = 0, deleted: int = 0, failed: int = 0, retried: int = 0):
+        with self.lock:
+            self.listed += listed
+            self.deleted += deleted
+            self.failed += failed
+            self.retried += retried
+
+class TransferStats:
+
+    def __init__(self):
+        self.lock = Lock()
+        self.start = time.perf_counter()
+        self.files = 0
+        self.bytes = 0
+        self.failed = 0
+        self.skipped = 0
+        self.skipped_bytes = 0
+        self.deleted = 0
+
+    def __repr__(self):
+        return f'TransferStats(files={self.files}, bytes={hsize(self.bytes)}, failed={self.failed}, ' \
+            f'skipped={self.skipped}, skipped_bytes={hsize(self.skipped_bytes)}, deleted={self.deleted}, ' \
+            f'rate={hsize(self.throughput())}/s)'
+
+    def add(self,
+            files: int = 0,
+            bytes: int = 0,
+            failed: int = 0,
+            skipped: int = 0,
+            skipped_bytes: int = 0,
+            deleted: int = 0):
+        with self.lock:
+            self.files += files
+            self.bytes += bytes
+            self.failed += failed
+            self.skipped += skipped
+            self.skipped_bytes += skipped_bytes
+            self.deleted += deleted
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def throughput(self):
+        elapsed = self.elapsed()
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+class ReadCache:
+
+    def __init__(self,
+            directory: str = None,
+            max_bytes: int = READ_CACHE_BYTES,
+            max_entry_bytes: int = None):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 's3-cache')
+        os.makedirs(self.directory, exist_ok = True)
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 4
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self.bytes_fetched = 0
+
+    @contextmanager
+    def _locked(self):
+        with self.lock:
+            with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _path(self, bucket: str, key: str):
+        return os.path.join(self.directory, hashlib.sha256(f'{bucket}/{key}'.encode()).hexdigest())
+
+    def clear(self):
+        with self._locked():
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.startswith('.'):
+                    os.remove(entry.path)
+
+    def etag(self, bucket: str, key: str):
+        try:
+            with open(self._path(bucket, key), 'rb') as frb:
+                return json.loads(frb.readline())['etag']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def evict(self):
+        with self._locked():
+            now = time.time()
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.startswith('.tmp-'):
+                    if now - st.st_mtime > READ_CACHE_TMP_TTL:
+                        os.remove(entry.path)
+                    continue
+                if entry.name.startswith('.'):
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+            entries.sort()
+            evicted = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+        with self.lock:
+            self.evictions += evicted
+
+    def open(self, bucket: str, key: str, etag: str = None):
+        path = self._path(bucket, key)
+        try:
+            frb = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            meta = json.loads(frb.readline())
+            if etag is not None and meta['etag'] != etag:
+                frb.close()
+                return None
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            frb.close()
+            return None
+        return {
+            'Body': StreamingBody(frb, meta['size']),
+            'ContentLength': meta['size'],
+            'ETag': meta['etag'],
+            'Metadata': meta.get('metadata', {}),
+            'ContentType': meta.get('content_type'),
+        }
+
+    def record(self, hit: bool, size: int):
+        with self.lock:
+            if hit:
+                self.hits += 1
+                self.bytes_saved += size
+            else:
+                self.misses += 1
+                self.bytes_fetched += size
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'bytes_saved': self.bytes_saved,
+                'bytes_fetched': self.bytes_fetched,
+            }
+
+    def store(self, bucket: str, key: str, res: dict):
+        meta = {
+            'bucket': bucket,
+            'key': key,
+            'etag': res['ETag'],
+            'size': res['ContentLength'],
+            'metadata': res.get('Metadata', {}),
+            'content_type': res.get('ContentType'),
+        }
+        tmp_path = os.path.join(self.directory, f'.tmp-{os.getpid()}-{get_ident()}-{random.getrandbits(32):08x}')
+        try:
+            with open(tmp_path, 'wb') as fwb:
+                fwb.write(json.dumps(meta).encode() + b'\n')
+                for chunk in res['Body'].iter_chunks(STREAM_CHUNK_SIZE):
+                    fwb.write(chunk)
+            os.replace(tmp_path, self._path(bucket, key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+        return self.open(bucket, key, res['ETag'])
+
+def _backoff(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP):
+    time.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
+
+def _bounded_map(fn: Callable, items: Iterable, thread_count: int, max_pending: int = None):
+    assert thread_count >= 1, 'Thread count must be greater than or equal to 1'
+    max_pending = max_pending or 2 * thread_count
+    items_iter = iter(items)
+    with ThreadPoolExecutor(max_workers = thread_count) as pool:
+        pending: set[Future] = set()
+        while True:
+            for item in islice(items_iter, max_pending - len(pending)):
+                pending.add(pool.submit(fn, item))
+            if len(pending) == 0:
+                break
+            done, pending = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def _decompress_chunks(chunks: Iterable[bytes], compression: Compression):
+    if compression == Compression.NONE:
+        yield from chunks
+        return
+    if compression == Compression.GZIP:
+        new = lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif compression == Compression.BZ2:
+        new = bz2.BZ2Decompressor
+    elif zstandard is None:
+        raise ImportError('zstandard is required for Compression.ZSTD')
+    else:
+        new = lambda: zstandard.ZstdDecompressor().decompressobj()
+    decompressor = new()
+    for chunk in chunks:
+        while len(chunk) > 0:
+            yield decompressor.decompress(chunk)
+            if not getattr(decompressor, 'eof', False):
+                break
+            chunk = decompressor.unused_data
+            decompressor = new()
+
+def _detect_compression(key: str):
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(key)[1].lower(), Compression.NONE)
+
+def _split_lines(chunks: Iterable[bytes], encoding: str, keepends: bool):
+    rest = b''
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        lines = (rest + chunk).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            if keepends:
+                yield line.decode(encoding) + '\n'
+            else:
+                yield line.rstrip(b'\r').decode(encoding)
+    if len(rest) > 0:
+        yield rest.decode(encoding) if keepends else rest.rstrip(b'\r').decode(encoding)
+
+def _parse_records(lines: Iterator[str], fmt: RecordFormat, csv_kwargs: dict):
+    if fmt == RecordFormat.JSONL:
+        for line in lines:
+            if line.strip() != '':
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(lines, **(csv_kwargs or {}))
+
+class _Crc32:
+
+    def __init__(self, data: bytes = b''):
+        self.value = zlib.crc32(data)
+
+    def digest(self):
+        return self.value.to_bytes(4, 'big')
+
+    def update(self, data: bytes):
+        self.value = zlib.crc32(data, self.value)
+
+CHECKSUM_HASHERS: Dict[str, Callable] = {
+    'ChecksumSHA256': hashlib.sha256,
+    'ChecksumSHA1': hashlib.sha1,
+    'ChecksumCRC32': _Crc32,
+}
+
+def _etag_is_md5(head: dict):
+    # SSE-KMS and SSE-C objects get opaque ETags
+    return head.get('ServerSideEncryption') not in KMS_ENCRYPTION and head.get('SSECustomerAlgorithm') is None
+
+def _file_md5(filename: str):
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as frb:
+        while chunk := frb.read(HASH_CHUNK_SIZE):
+            md5.update(chunk)
+    return md5.hexdigest()
 
 def exhaust(generator):
     deque(generator, maxlen = 0)
@@ -51,7 +409,8 @@ class S3():
             client = None,
             profile: str = None,
             bucket: str = None,
-            requester: bool = None):
+            requester: bool = None,
+            cache: ReadCache = None):
         if client is not None:
             self.client = client
         elif profile is not None:
@@ -60,6 +419,251 @@ class S3():
             self.client = boto3.client(CLIENT_NAME, config = CLIENT_CONFIG)
         self.bucket = enval(bucket)
         self.requester = requester
+        self.cache = cache
+
+    def _cached_get(self, kwargs: Dict[str, Any]):
+        bucket = kwargs['Bucket']
+        key = kwargs['Key']
+        etag = self.cache.etag(bucket, key)
+        try:
+            if etag is not None:
+                res = self.client.get_object(**kwargs, IfNoneMatch = etag)
+            else:
+                res = self.client.get_object(**kwargs)
+        except ClientError as e:
+            if etag is None or e.response.get('Error', {}).get('Code') not in NOT_MODIFIED_CODES:
+                raise
+            res = self.cache.open(bucket, key, etag)
+            if res is not None:
+                self.cache.record(True, res['ContentLength'])
+                return res
+            res = self.client.get_object(**kwargs)
+        self.cache.record(False, res['ContentLength'])
+        if res['ContentLength'] > self.cache.max_entry_bytes:
+            return res
+        cached = self.cache.store(bucket, key, res)
+        return cached if cached is not None else self.client.get_object(**kwargs)
+
+    def _delete_batch(self, kwargs: Dict[str, Any], keys: List[str], retries: int, stats: DeleteStats):
+        deleted = []
+        failed = []
+        attempt = 0
+        while True:
+            res = self.client.delete_objects(**kwargs, Delete = {
+                'Objects': [ { 'Key': key } for key in keys ],
+                'Quiet': False,
+            })
+            deleted.extend(res.get('Deleted', []))
+            errors = res.get('Errors', [])
+            retry = [ err for err in errors if err.get('Code') in RETRY_CODES ] if attempt < retries else []
+            errors = [ err for err in errors if err not in retry ]
+            failed.extend(errors)
+            stats.add(deleted = len(res.get('Deleted', [])), failed = len(errors), retried = len(retry))
+            if len(retry) == 0:
+                return deleted, failed
+            keys = [ err['Key'] for err in retry ]
+            _backoff(attempt)
+            attempt += 1
+
+    def _iterate_chunks(self, keys: Iterable[str],
+            bucket: str = None,
+            requester: bool = None,
+            chunk_size: int = STREAM_CHUNK_SIZE,
+            read_ahead: int = 1):
+        stop = Event()
+        def put(queue: Queue, item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout = 0.1)
+                    return
+                except QFull:
+                    continue
+        def read_worker(key: str, queue: Queue):
+            try:
+                res = self.get_object(key, bucket = bucket, requester = requester)
+                for chunk in res['Body'].iter_chunks(chunk_size):
+                    if stop.is_set():
+                        break
+                    put(queue, chunk)
+            except Exception as e:
+                put(queue, e)
+            finally:
+                put(queue, None)
+        def drain(queue: Queue):
+            while (chunk := queue.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        keys_iter = iter(keys)
+        with ThreadPoolExecutor(max_workers = read_ahead + 1) as pool:
+            pending: deque[tuple[str, Queue]] = deque()
+            try:
+                while True:
+                    for key in islice(keys_iter, read_ahead + 1 - len(pending)):
+                        queue = Queue(maxsize = STREAM_QUEUE_SIZE)
+                        pool.submit(read_worker, key, queue)
+                        pending.append((key, queue))
+                    if len(pending) == 0:
+                        break
+                    key, queue = pending.popleft()
+                    chunks = drain(queue)
+                    yield key, chunks
+                    exhaust(chunks)
+            finally:
+                stop.set()
+
+    def _iterate_shards(self, kwargs: Dict[str, Any],
+            thread_count: int,
+            shard_by: ShardBy,
+            shard_count: int,
+            delimiter: str,
+            ordered: bool):
+        assert thread_count >= 1, 'Thread count must be greater than or equal to 1'
+        shard_count = shard_count or 4 * thread_count
+        if shard_by == ShardBy.PREFIX:
+            shards = self._prefix_shards(kwargs, thread_count, shard_count, delimiter)
+        else:
+            shards = iter(self._range_shards(kwargs.get('Prefix', ''), shard_count))
+        max_pending = 2 * thread_count
+        stop = Event()
+        def put(queue: Queue, item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout = 0.1)
+                    return
+                except QFull:
+                    continue
+        def shard_worker(shard: tuple, queue: Queue):
+            try:
+                shard_kwargs, end = shard
+                shard_kwargs = kwargs | shard_kwargs
+                while not stop.is_set():
+                    res = self.client.list_objects_v2(**shard_kwargs)
+                    page = res.get('Contents', [])
+                    if end is not None and len(page) > 0 and page[-1]['Key'] > end:
+                        put(queue, [ obj for obj in page if obj['Key'] <= end ])
+                        break
+                    if len(page) > 0:
+                        put(queue, page)
+                    if not res['IsTruncated']:
+                        break
+                    shard_kwargs['ContinuationToken'] = res['NextContinuationToken']
+            except Exception as e:
+                put(queue, e)
+            finally:
+                put(queue, None)
+        # loose objects found during discovery arrive as ready pages; prefix and range shards go to the pool
+        with ThreadPoolExecutor(max_workers = thread_count) as pool:
+            try:
+                if ordered:
+                    pending: deque[list | Queue] = deque()
+                    while True:
+                        while len(pending) < max_pending and (shard := next(shards, None)) is not None:
+                            if isinstance(shard, list):
+                                pending.append(shard)
+                            else:
+                                queue = Queue(maxsize = 2)
+                                pool.submit(shard_worker, shard, queue)
+                                pending.append(queue)
+                        if len(pending) == 0:
+                            break
+                        item = pending.popleft()
+                        if isinstance(item, list):
+                            yield item
+                            continue
+                        while (page := item.get()) is not None:
+                            if isinstance(page, Exception):
+                                raise page
+                            yield page
+                else:
+                    shared = Queue(maxsize = max_pending)
+                    remaining = 0
+                    while True:
+                        while remaining < max_pending and (shard := next(shards, None)) is not None:
+                            if isinstance(shard, list):
+                                yield shard
+                            else:
+                                pool.submit(shard_worker, shard, shared)
+                                remaining += 1
+                        if remaining == 0:
+                            break
+                        page = shared.get()
+                        if page is None:
+                            remaining -= 1
+                        elif isinstance(page, Exception):
+                            raise page
+                        else:
+                            yield page
+            finally:
+                stop.set()
+
+    def _prefix_shards(self, kwargs: Dict[str, Any], thread_count: int, shard_count: int, delimiter: str):
+        prefix = kwargs.get('Prefix', '')
+        while True:
+            list_kwargs = kwargs | { 'Prefix': prefix, 'Delimiter': delimiter }
+            res = self.client.list_objects_v2(**list_kwargs)
+            objects = res.get('Contents', [])
+            prefixes = [ cp['Prefix'] for cp in res.get('CommonPrefixes', []) ]
+            if len(prefixes) == 1 and len(objects) == 0 and not res['IsTruncated'] and thread_count > 1:
+                prefix = prefixes[0]
+                continue
+            break
+        # a flat prefix has nothing to split on, so split its key range instead
+        if len(prefixes) < 2 or (res['IsTruncated'] and len(objects) > len(prefixes)):
+            yield from self._range_shards(prefix, shard_count)
+            return
+        while True:
+            merged = sorted([ (obj['Key'], obj) for obj in objects ] + [ (p, None) for p in prefixes ], key = lambda x: x[0])
+            loose = []
+            for lead, obj in merged:
+                if obj is not None:
+                    loose.append(obj)
+                    continue
+                if len(loose) > 0:
+                    yield loose
+                    loose = []
+                yield ({ 'Prefix': lead }, None)
+            if len(loose) > 0:
+                yield loose
+            if not res['IsTruncated']:
+                return
+            list_kwargs['ContinuationToken'] = res['NextContinuationToken']
+            res = self.client.list_objects_v2(**list_kwargs)
+            objects = res.get('Contents', [])
+            prefixes = [ cp['Prefix'] for cp in res.get('CommonPrefixes', []) ]
+
+    def _range_shards(self, prefix: str, shard_count: int):
+        step = max(1, len(SHARD_CHARS) // shard_count)
+        bounds = [ prefix + c for c in SHARD_CHARS[step::step] ]
+        starts = [ None ] + bounds
+        ends = bounds + [ None ]
+        return [ ({ 'StartAfter': start } if start is not None else {}, end) for start, end in zip(starts, ends) ]
+
+    def _unchanged(self, filename: str, key: str, size: int, mtime: str, obj: dict,
+            bucket: str = None,
+            requester: bool = None):
+        if obj['Size'] != size:
+            return False
+        head = self.head_object(key, bucket = bucket, requester = requester)
+        if head.get('Metadata', {}).get(MTIME_META) == mtime:
+            return True
+        etag = head['ETag'].strip('"')
+        if '-' not in etag and _etag_is_md5(head):
+            return _file_md5(filename) == etag
+        return False
+
+    def _yield_page(self, page: List[dict],
+            object_map: Callable = None,
+            batch_action: Callable = None):
+        if batch_action is not None:
+            batch_action(page)
+        if object_map is None:
+            yield from page
+        else:
+            for obj in page:
+                obj_res = object_map(obj)
+                if obj_res is not None:
+                    yield obj
 
     def add_request_payer(self,
             kwargs: Dict[str, Any],
@@ -87,7 +691,24 @@ class S3():
     def count_objects(self, prefix: str,
             bucket: str = None,
             requester: bool = None,
-            extra_kwargs: dict = None) -> list:
+            extra_kwargs: dict = None,
+            thread_count: int = 1,
+            shard_by: ShardBy = ShardBy.PREFIX) -> list:
+        if thread_count > 1:
+            count = 0
+            size = 0
+            def action(objs: List[dict]):
+                nonlocal count, size
+                count += len(objs)
+                size += sum(obj['Size'] for obj in objs)
+            exhaust(self.iterate_objects(prefix = prefix,
+                bucket = bucket,
+                requester = requester,
+                extra_kwargs = extra_kwargs,
+                batch_action = action,
+                thread_count = thread_count,
+                shard_by = shard_by))
+            return count, size
         kwargs = {
             'Bucket': self.get_request_bucket(bucket),
             'Prefix': prefix,
@@ -108,35 +729,63 @@ class S3():
                 break
         return count, size
 
-    def delete_keys(self, keys: Iterable[str], bucket: str = None):
+    def delete_keys(self, keys: Iterable[str],
+            bucket: str = None,
+            requester: bool = None,
+            thread_count: int = 4,
+            retries: int = DELETE_RETRIES,
+            stats: DeleteStats = None,
+            dry_run: bool = False):
+        assert thread_count >= 1, 'Thread count must be greater than or equal to 1'
         kwargs = {
             'Bucket': self.get_request_bucket(bucket),
-            'Delete': {},
         }
+        self.add_request_payer(kwargs, requester)
+        if stats is None:
+            stats = DeleteStats()
         deleted = []
         failed = []
-        for i in range(0, len(keys), 1000):
-            kwargs['Delete']['Objects'] = [ { 'Key': key } for key in keys[i:i+1000] ]
-            res = self.client.delete_objects(**kwargs)
-            deleted.extend(res.get('Deleted', []))
-            failed.extend(res.get('Errors', []))
-        return deleted, failed
-
-    def delete_prefix(self, prefix: str):
-        deleted = []
-        failed = []
-        def action(objs: Iterable[dict]):
-            b_del, b_fail = self.delete_keys([ obj['Key'] for obj in objs ])
+        keys_iter = iter(keys)
+        def next_keys():
+            batch = list(islice(keys_iter, DELETE_BATCH_SIZE))
+            stats.add(listed = len(batch))
+            return batch
+        if dry_run:
+            while len(batch := next_keys()) > 0:
+                deleted.extend({ 'Key': key } for key in batch)
+            return deleted, failed
+        def delete_batch(batch: List[str]):
+            return self._delete_batch(kwargs, batch, retries, stats)
+        batches = iter(next_keys, [])
+        for b_del, b_fail in _bounded_map(delete_batch, batches, thread_count):
             deleted.extend(b_del)
             failed.extend(b_fail)
-        exhaust(self.iterate_objects(prefix = prefix, batch_action = action))
         return deleted, failed
 
+    def delete_prefix(self, prefix: str,
+            bucket: str = None,
+            requester: bool = None,
+            thread_count: int = 4,
+            retries: int = DELETE_RETRIES,
+            stats: DeleteStats = None,
+            dry_run: bool = False):
+        objs = self.iterate_objects(prefix = prefix, bucket = bucket, requester = requester)
+        return self.delete_keys(( obj['Key'] for obj in objs ),
+            bucket = bucket,
+            requester = requester,
+            thread_count = thread_count,
+            retries = retries,
+            stats = stats,
+            dry_run = dry_run)
+
     def download(self, key: str,
             bucket: str = None,
             filepath: str = None,
             verbosity: int = 0,
             callback: Callable[[int, int], None] = None,
+            size: int = None,
+            requester: bool = None,
+            config: TransferConfig = None,
         ):
         if filepath is None:
             filepath = key.split('/')[-1]
@@ -155,8 +804,23 @@ class S3():
             print(f'Downloading\t{key}')
         elif verbosity == 2:
             print(f'Downloading\ts3://{kwargs["Bucket"]}/{key}\n\t=>\t{filepath}')
+        if self.cache is not None:
+            res = self.get_object(key, bucket = bucket, requester = requester)
+            with open(filepath, 'wb') as fwb:
+                for chunk in res['Body'].iter_chunks(STREAM_CHUNK_SIZE):
+                    fwb.write(chunk)
+                    if callback is not None:
+                        callback(res['ContentLength'], len(chunk))
+            res['Body'].close()
+            return filepath
+        extra_args = {}
+        self.add_request_payer(extra_args, requester)
+        if len(extra_args) > 0:
+            kwargs['ExtraArgs'] = extra_args
+        if config is not None:
+            kwargs['Config'] = config
         if callback is not None:
-            total_size = self.head_object(key)['ContentLength']
+            total_size = size if size is not None else self.head_object(key, bucket = bucket, requester = requester)['ContentLength']
             def _callback(bytes_amount):
                 callback(total_size, bytes_amount)
             kwargs['Callback'] = _callback
@@ -165,36 +829,14 @@ class S3():
 
     def download_many(self, params_list: Iterable[str | dict],
             thread_count: int = 4,
-            verbosity: int = 0):
-        # Validate thread count
-        assert thread_count >= 1, 'Thread count must be greater than or equal to 1'
-        assert thread_count <= 8, 'Thread count must be less than or equal to 8'
-        # Put params_list into a queue
-        params_queue = Queue()
-        for params in params_list:
-            params_queue.put(params)
-        # Define the worker function for downloading
-        def download_worker():
-            while True:
-                try:
-                    kwargs = params_queue.get_nowait()
-                    if isinstance(kwargs, str):
-                        kwargs = { 'key': kwargs }
-                    elif not isinstance(kwargs, dict):
-                        raise ValueError('Params must be a string or a dict with "key" and optional "bucket" and "filepath"')
-                    kwargs['verbosity'] = verbosity
-                    self.download(**kwargs)
-                except QEmpty:
-                    break
-        # Create and start threads
-        threads: List[Thread] = []
-        for _ in range(thread_count):
-            thread = Thread(target = download_worker)
-            thread.start()
-            threads.append(thread)
-        # Wait for all threads to finish
-        for thread in threads:
-            thread.join()
+            verbosity: int = 0,
+            config: TransferConfig = None,
+            stats: TransferStats = None):
+        return list(self.iterate_downloads(params_list,
+            thread_count = thread_count,
+            verbosity = verbosity,
+            config = config,
+            stats = stats))
 
     def get_object(self, key: str,
             bucket: str = None,
@@ -204,20 +846,138 @@ class S3():
             'Key': key,
         }
         self.add_request_payer(kwargs, requester)
+        if self.cache is not None:
+            return self._cached_get(kwargs)
         return self.client.get_object(**kwargs)
 
     def get_object_as_str(self, key: str,
             bucket: str = None,
-            requester: bool = None):
+            requester: bool = None,
+            thread_count: int = 1,
+            checksum: bool = True):
+        if thread_count > 1:
+            buffer = self.get_object_ranged(key, bucket = bucket, requester = requester,
+                thread_count = thread_count,
+                checksum = checksum)
+            return buffer.decode()
         res = self.get_object(key, bucket = bucket, requester = requester)
         return res['Body'].read().decode()
 
+    def get_object_ranged(self, key: str,
+            bucket: str = None,
+            requester: bool = None,
+            buffer: bytearray | memoryview = None,
+            filepath: str = None,
+            part_size: int = RANGE_PART_SIZE,
+            thread_count: int = 8,
+            checksum: bool = True):
+        kwargs = {
+            'Bucket': self.get_request_bucket(bucket),
+            'Key': key,
+        }
+        self.add_request_payer(kwargs, requester)
+        head = self.client.head_object(**kwargs, ChecksumMode = 'ENABLED')
+        etag: str = head['ETag'].strip('"')
+        size = head['ContentLength']
+        multipart = False
+        algorithm = None
+        composite = False
+        if checksum:
+            algorithm = next(( name for name in CHECKSUM_HASHERS if name in head ), None)
+            if algorithm is not None:
+                composite = head.get('ChecksumType') == 'COMPOSITE' or '-' in head[algorithm]
+        # per-part checksums only verify when ranges follow the upload's part layout
+        if '-' in etag and (composite or (checksum and algorithm is None and _etag_is_md5(head))):
+            part_head = self.client.head_object(**kwargs, PartNumber = 1, IfMatch = head['ETag'])
+            parts_count = part_head.get('PartsCount')
+            if parts_count is not None and part_head['ContentLength'] > 0:
+                multipart = parts_count == -(-size // part_head['ContentLength'])
+                if multipart:
+                    part_size = part_head['ContentLength']
+        ranges = [ (start, min(start + part_size, size)) for start in range(0, size, part_size) ]
+        # prefer the object's additional checksum over the ETag
+        expected = None
+        hasher = None
+        per_part = False
+        if checksum:
+            if algorithm is not None and (not composite or multipart):
+                expected = head[algorithm]
+                hasher = CHECKSUM_HASHERS[algorithm]
+                per_part = composite
+            if expected is None and _etag_is_md5(head) and (multipart or '-' not in etag):
+                expected = etag
+                hasher = hashlib.md5
+                per_part = multipart
+        mm = None
+        fwb = None
+        if filepath is not None:
+            dirname = os.path.dirname(filepath)
+            if dirname != '':
+                os.makedirs(dirname, exist_ok = True)
+            fwb = open(filepath, 'wb+')
+            fwb.truncate(size)
+            if size > 0:
+                mm = mmap.mmap(fwb.fileno(), size)
+            view = memoryview(mm) if mm is not None else memoryview(bytearray())
+        else:
+            if buffer is None:
+                buffer = bytearray(size)
+            view = memoryview(buffer).cast('B')
+            assert len(view) >= size, f'Buffer of {len(view)} bytes is too small for {size} bytes'
+        def get_range(bounds: tuple):
+            start, end = bounds
+            res = self.client.get_object(**kwargs,
+                Range = f'bytes={start}-{end - 1}',
+                IfMatch = head['ETag'])
+            offset = start
+            part_hash = hasher() if per_part else None
+            for chunk in res['Body'].iter_chunks(HASH_CHUNK_SIZE):
+                view[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+                if part_hash is not None:
+                    part_hash.update(chunk)
+            if offset != end:
+                raise IOError(f'Short read for s3://{kwargs["Bucket"]}/{key} range {start}-{end - 1}: {offset - start} bytes')
+            return start, part_hash.digest() if part_hash is not None else None
+        try:
+            digests = dict(_bounded_map(get_range, ranges, thread_count))
+            if expected is not None:
+                if per_part:
+                    digest = hasher(b''.join(digests[start] for start, _ in ranges)).digest()
+                    suffix = f'-{len(ranges)}'
+                else:
+                    full_hash = hasher()
+                    full_hash.update(view[:size])
+                    digest = full_hash.digest()
+                    suffix = ''
+                if hasher is hashlib.md5:
+                    actual = digest.hex() + suffix
+                else:
+                    actual = b64encode(digest).decode() + suffix
+                if actual != expected:
+                    raise ValueError(f'Checksum mismatch for s3://{kwargs["Bucket"]}/{key}: expected {expected}, got {actual}')
+        finally:
+            if fwb is not None:
+                view.release()
+                if mm is not None:
+                    mm.flush()
+                    mm.close()
+                fwb.close()
+        return filepath if filepath is not None else buffer
+
     def get_object_to_file(self, key: str,
             filepath: str = None,
             bucket: str = None,
-            requester: bool = None):
+            requester: bool = None,
+            thread_count: int = 1,
+            checksum: bool = True):
         if filepath is None:
             filepath = key.split('/')[-1]
+        if thread_count > 1:
+            return self.get_object_ranged(key, bucket = bucket, requester = requester,
+                filepath = filepath,
+                thread_count = thread_count,
+                checksum = checksum)
         res = self.get_object(key, bucket = bucket, requester = requester)
         with open(filepath, 'wb') as fwb:
             for chunk in res['Body'].iter_chunks():
@@ -236,13 +996,62 @@ class S3():
         self.add_request_payer(kwargs, requester)
         return self.client.head_object(**kwargs)
 
+    def iterate_downloads(self, params_list: Iterable[str | dict],
+            thread_count: int = 4,
+            verbosity: int = 0,
+            config: TransferConfig = None,
+            stats: TransferStats = None):
+        if config is None:
+            config = TransferConfig(max_concurrency = 2)
+        if stats is None:
+            stats = TransferStats()
+        def download_one(params: str | dict):
+            if isinstance(params, str):
+                kwargs = { 'key': params }
+            elif isinstance(params, dict):
+                if 'Key' in params:
+                    kwargs = { 'key': params['Key'], 'size': params.get('Size') }
+                else:
+                    kwargs = dict(params)
+            else:
+                raise ValueError('Params must be a string, a listed object or a dict with "key" and optional "bucket" and "filepath"')
+            result = { 'key': kwargs['key'], 'filepath': None, 'size': kwargs.get('size'), 'error': None }
+            try:
+                result['filepath'] = self.download(**kwargs, verbosity = verbosity, config = config)
+                if result['size'] is None:
+                    result['size'] = os.path.getsize(result['filepath'])
+                stats.add(files = 1, bytes = result['size'])
+            except Exception as e:
+                result['error'] = e
+                stats.add(failed = 1)
+            return result
+        yield from _bounded_map(download_one, params_list, thread_count)
+
+    def iterate_lines(self, key: str,
+            bucket: str = None,
+            requester: bool = None,
+            compression: Compression = None,
+            encoding: str = 'utf-8',
+            keepends: bool = False,
+            chunk_size: int = STREAM_CHUNK_SIZE):
+        res = self.get_object(key, bucket = bucket, requester = requester)
+        if compression is None:
+            compression = _detect_compression(key)
+        chunks = _decompress_chunks(res['Body'].iter_chunks(chunk_size), compression)
+        yield from _split_lines(chunks, encoding, keepends)
+
     def iterate_objects(self,
             prefix: str = None,
             bucket: str = None,
             requester: bool = None,
             extra_kwargs: dict = None,
             object_map: Callable = None,
-            batch_action: Callable = None):
+            batch_action: Callable = None,
+            thread_count: int = 1,
+            shard_by: ShardBy = ShardBy.PREFIX,
+            shard_count: int = None,
+            delimiter: str = '/',
+            ordered: bool = False):
         kwargs = {
             'Bucket': self.get_request_bucket(bucket),
         }
@@ -251,24 +1060,80 @@ class S3():
         if extra_kwargs is not None:
             kwargs.update(extra_kwargs)
         self.add_request_payer(kwargs, requester)
+        if thread_count > 1:
+            pages = self._iterate_shards(kwargs, thread_count, shard_by, shard_count, delimiter, ordered)
+            for page in pages:
+                yield from self._yield_page(page, object_map, batch_action)
+            return
         while True:
             res = self.client.list_objects_v2(**kwargs)
             if res['KeyCount'] > 0:
-                if batch_action is not None:
-                    batch_action(res['Contents'])
-                if object_map is None:
-                    for obj in res['Contents']:
-                        yield obj
-                else:
-                    for obj in res['Contents']:
-                        obj_res = object_map(obj)
-                        if obj_res is not None:
-                            yield obj
+                yield from self._yield_page(res['Contents'], object_map, batch_action)
             if res['IsTruncated']:
                 kwargs['ContinuationToken'] = res['NextContinuationToken']
             else:
                 break
 
+    def iterate_prefix_records(self, prefix: str,
+            fmt: RecordFormat = RecordFormat.JSONL,
+            bucket: str = None,
+            requester: bool = None,
+            compression: Compression = None,
+            encoding: str = 'utf-8',
+            chunk_size: int = STREAM_CHUNK_SIZE,
+            read_ahead: int = 1,
+            object_map: Callable = None,
+            csv_kwargs: dict = None):
+        objs = self.iterate_objects(prefix = prefix, bucket = bucket, requester = requester, object_map = object_map)
+        keys = ( obj['Key'] for obj in objs if not obj['Key'].endswith('/') )
+        for key, chunks in self._iterate_chunks(keys, bucket, requester, chunk_size, read_ahead):
+            chunks = _decompress_chunks(chunks, compression or _detect_compression(key))
+            lines = _split_lines(chunks, encoding, fmt == RecordFormat.CSV)
+            yield from _parse_records(lines, fmt, csv_kwargs)
+
+    def iterate_records(self, key: str,
+            fmt: RecordFormat = RecordFormat.JSONL,
+            bucket: str = None,
+            requester: bool = None,
+            compression: Compression = None,
+            encoding: str = 'utf-8',
+            chunk_size: int = STREAM_CHUNK_SIZE,
+            csv_kwargs: dict = None):
+        lines = self.iterate_lines(key,
+            bucket = bucket,
+            requester = requester,
+            compression = compression,
+            encoding = encoding,
+            keepends = fmt == RecordFormat.CSV,
+            chunk_size = chunk_size)
+        yield from _parse_records(lines, fmt, csv_kwargs)
+
+    def iterate_uploads(self, params_list: Iterable[tuple | dict],
+            thread_count: int = 4,
+            config: TransferConfig = None,
+            stats: TransferStats = None):
+        if config is None:
+            config = TransferConfig(max_concurrency = 2)
+        if stats is None:
+            stats = TransferStats()
+        def upload_one(params: tuple | dict):
+            if isinstance(params, tuple):
+                kwargs = { 'filename': params[0], 'key': params[1] }
+            elif isinstance(params, dict):
+                kwargs = dict(params)
+            else:
+                raise ValueError('Params must be a (filename, key) tuple or a dict with "filename" and "key"')
+            result = { 'key': kwargs['key'], 'filename': kwargs['filename'], 'size': None, 'error': None }
+            try:
+                result['size'] = os.path.getsize(kwargs['filename'])
+                self.upload(**kwargs, config = config)
+                stats.add(files = 1, bytes = result['size'])
+            except Exception as e:
+                result['error'] = e
+                stats.add(failed = 1)
+            return result
+        yield from _bounded_map(upload_one, params_list, thread_count)
+
     def list_keys(self, prefix: str,
             bucket: str = None,
             requester: bool = None) -> List[str]:
@@ -278,7 +1143,18 @@ class S3():
     def list_objects(self, prefix: str,
             bucket: str = None,
             requester: bool = None,
-            extra_kwargs: dict = None) -> list:
+            extra_kwargs: dict = None,
+            thread_count: int = 1,
+            shard_by: ShardBy = ShardBy.PREFIX,
+            ordered: bool = True) -> list:
+        if thread_count > 1:
+            return list(self.iterate_objects(prefix = prefix,
+                bucket = bucket,
+                requester = requester,
+                extra_kwargs = extra_kwargs,
+                thread_count = thread_count,
+                shard_by = shard_by,
+                ordered = ordered))
         kwargs = {
             'Bucket': self.get_request_bucket(bucket),
             'Prefix': prefix,
@@ -313,6 +1189,23 @@ class S3():
             ]
         }
 
+    def open_writer(self, key: str,
+            bucket: str = None,
+            requester: bool = None,
+            meta: Dict[str, str] = None,
+            content_type: str = None,
+            part_size: int = MULTIPART_PART_SIZE,
+            thread_count: int = 4,
+            max_in_flight: int = 4):
+        return MultipartWriter(self, key,
+            bucket = bucket,
+            requester = requester,
+            meta = meta,
+            content_type = content_type,
+            part_size = part_size,
+            thread_count = thread_count,
+            max_in_flight = max_in_flight)
+
     def presign(self, key: str,
             bucket: str = None,
             expiration: int = 3600,
@@ -349,6 +1242,26 @@ class S3():
             kwargs['ContentType'] = content_type
         self.client.put_object(**kwargs)
 
+    def put_stream(self, key: str, chunks: Iterable[bytes | str],
+            bucket: str = None,
+            requester: bool = None,
+            meta: Dict[str, str] = None,
+            content_type: str = None,
+            part_size: int = MULTIPART_PART_SIZE,
+            thread_count: int = 4,
+            max_in_flight: int = 4):
+        with self.open_writer(key,
+                bucket = bucket,
+                requester = requester,
+                meta = meta,
+                content_type = content_type,
+                part_size = part_size,
+                thread_count = thread_count,
+                max_in_flight = max_in_flight) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+        return writer.result
+
     def rename(self, key: str, new_key: str,
             dst_bucket: str = None,
             src_bucket: str = None):
@@ -373,12 +1286,75 @@ class S3():
         self.add_request_payer(kwargs, requester)
         return self.client.restore_object(**kwargs)
 
+    def sync_dir(self, local_dir: str,
+            prefix: str = '',
+            bucket: str = None,
+            requester: bool = None,
+            thread_count: int = 4,
+            config: TransferConfig = None,
+            stats: TransferStats = None,
+            delete: bool = False,
+            meta: Dict[str, str] = None,
+            content_type: str = None):
+        if prefix != '' and not prefix.endswith('/'):
+            prefix += '/'
+        if config is None:
+            config = TransferConfig(max_concurrency = 2)
+        if stats is None:
+            stats = TransferStats()
+        remote = { obj['Key']: obj for obj in self.iterate_objects(prefix = prefix,
+            bucket = bucket,
+            requester = requester,
+            thread_count = thread_count) }
+        seen = set()
+        def local_files():
+            for root, _, files in os.walk(local_dir):
+                for name in sorted(files):
+                    filename = os.path.join(root, name)
+                    key = prefix + os.path.relpath(filename, local_dir).replace(os.sep, '/')
+                    seen.add(key)
+                    yield filename, key
+        def sync_one(params: tuple):
+            filename, key = params
+            result = { 'key': key, 'filename': filename, 'size': None, 'action': 'upload', 'error': None }
+            try:
+                st = os.stat(filename)
+                mtime = str(int(st.st_mtime))
+                result['size'] = st.st_size
+                obj = remote.get(key)
+                if obj is not None and self._unchanged(filename, key, st.st_size, mtime, obj, bucket, requester):
+                    result['action'] = 'skip'
+                    stats.add(skipped = 1, skipped_bytes = st.st_size)
+                    return result
+                self.upload(filename, key,
+                    bucket = bucket,
+                    requester = requester,
+                    meta = (meta or {}) | { MTIME_META: mtime },
+                    content_type = content_type,
+                    config = config)
+                stats.add(files = 1, bytes = st.st_size)
+            except Exception as e:
+                result['error'] = e
+                stats.add(failed = 1)
+            return result
+        results = list(_bounded_map(sync_one, local_files(), thread_count))
+        extras = [ key for key in remote if key not in seen ]
+        if delete and len(extras) > 0:
+            deleted, failed = self.delete_keys(extras, bucket = bucket, requester = requester, thread_count = thread_count)
+            stats.add(deleted = len(deleted), failed = len(failed))
+            for obj in deleted:
+                results.append({ 'key': obj['Key'], 'filename': None, 'size': remote[obj['Key']]['Size'], 'action': 'delete', 'error': None })
+            for err in failed:
+                results.append({ 'key': err['Key'], 'filename': None, 'size': remote[err['Key']]['Size'], 'action': 'delete', 'error': err })
+        return results
+
     def upload(self, filename: str, key: str,
             bucket: str = None,
             requester: bool = None,
             meta: Dict[str, str] = None,
             content_type: str = None,
-            callback: Callable[[int], None] = None):
+            callback: Callable[[int], None] = None,
+            config: TransferConfig = None):
         extra_args = {}
         if meta is not None:
             extra_args['Metadata'] = meta
@@ -392,5 +1368,133 @@ class S3():
         }
         if callback is not None:
             kwargs['Callback'] = callback
+        if config is not None:
+            kwargs['Config'] = config
         self.add_request_payer(extra_args, requester)
         return self.client.upload_file(**kwargs)
+
+    def upload_many(self, params_list: Iterable[tuple | dict],
+            thread_count: int = 4,
+            config: TransferConfig = None,
+            stats: TransferStats = None):
+        return list(self.iterate_uploads(params_list,
+            thread_count = thread_count,
+            config = config,
+            stats = stats))
+
+class MultipartWriter:
+
+    def __init__(self, s3: S3, key: str,
+            bucket: str = None,
+            requester: bool = None,
+            meta: Dict[str, str] = None,
+            content_type: str = None,
+            part_size: int = MULTIPART_PART_SIZE,
+            thread_count: int = 4,
+            max_in_flight: int = 4):
+        assert thread_count >= 1, 'Thread count must be greater than or equal to 1'
+        assert part_size >= MULTIPART_MIN_PART_SIZE, f'Part size must be at least {MULTIPART_MIN_PART_SIZE} bytes'
+        self.s3 = s3
+        self.kwargs = {
+            'Bucket': s3.get_request_bucket(bucket),
+            'Key': key,
+        }
+        s3.add_request_payer(self.kwargs, requester)
+        self.extra_args = {}
+        if meta is not None:
+            self.extra_args['Metadata'] = meta
+        if content_type is not None:
+            self.extra_args['ContentType'] = content_type
+        self.part_size = part_size
+        self.thread_count = thread_count
+        self.max_in_flight = max_in_flight
+        self.buffer = bytearray()
+        self.upload_id: str = None
+        self.pool: ThreadPoolExecutor = None
+        self.pending: deque[Future] = deque()
+        self.parts: List[dict] = []
+        self.size = 0
+        self.closed = False
+        self.result: dict = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _submit(self, data: bytes):
+        if self.upload_id is None:
+            res = self.s3.client.create_multipart_upload(**self.kwargs, **self.extra_args)
+            self.upload_id = res['UploadId']
+            self.pool = ThreadPoolExecutor(max_workers = self.thread_count)
+        part_number = len(self.parts) + len(self.pending) + 1
+        assert part_number <= MULTIPART_MAX_PARTS, f'Multipart uploads are limited to {MULTIPART_MAX_PARTS} parts'
+        self.pending.append(self.pool.submit(self._upload_part, part_number, data))
+        # completed parts are collected in order, so memory stays bounded by max_in_flight parts
+        while len(self.pending) > self.max_in_flight or (len(self.pending) > 0 and self.pending[0].done()):
+            self.parts.append(self.pending.popleft().result())
+
+    def _upload_part(self, part_number: int, data: bytes):
+        res = self.s3.client.upload_part(**self.kwargs,
+            UploadId = self.upload_id,
+            PartNumber = part_number,
+            Body = data)
+        return { 'ETag': res['ETag'], 'PartNumber': part_number }
+
+    def abort(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.buffer = bytearray()
+        if self.pool is not None:
+            self.pool.shutdown(wait = True, cancel_futures = True)
+        if self.upload_id is not None:
+            self.s3.client.abort_multipart_upload(**self.kwargs, UploadId = self.upload_id)
+
+    def close(self):
+        if self.closed:
+            return self.result
+        try:
+            if self.upload_id is None:
+                self.result = self.s3.client.put_object(**self.kwargs, **self.extra_args, Body = bytes(self.buffer))
+            else:
+                if len(self.buffer) > 0:
+                    self._submit(bytes(self.buffer))
+                while len(self.pending) > 0:
+                    self.parts.append(self.pending.popleft().result())
+                self.result = self.s3.client.complete_multipart_upload(**self.kwargs,
+                    UploadId = self.upload_id,
+                    MultipartUpload = { 'Parts': self.parts })
+                self.pool.shutdown(wait = True)
+        except BaseException:
+            self.abort()
+            raise
+        self.closed = True
+        self.buffer = bytearray()
+        return self.result
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def write(self, data: bytes | str):
+        assert not self.closed, 'Writer is closed'
+        if isinstance(data, str):
+            data = data.encode()
+        self.buffer.extend(data)
+        self.size += len(data)
+        try:
+            while len(self.buffer) >= self.part_size:
+                part = bytes(self.buffer[:self.part_size])
+                del self.buffer[:self.part_size]
+                self._submit(part)
+        except BaseException:
+            self.abort()
+            raise
+        return len(data)